@@ -0,0 +1,137 @@
+"""
+BOOKING ANALYTICS: Daily / hourly demand read from the booking_rollup table.
+
+booking_rollup holds one row per (date, start hour, room) with the number of
+bookings made for it. It is bumped in the same transaction as every booking
+insert, and can be rebuilt from bookings_new + bookings_archive with one
+GROUP BY (`rebuild_rollup`). Archiving bookings leaves the counts alone.
+Forecasts fit on a few hundred aggregate rows instead of loading the
+bookings table.
+
+Pages only read the rollup. Filling it for a database that predates it is
+init-db's job (ensure_rollup), never a request's.
+"""
+from collections import Counter
+
+from sqlalchemy import func, extract, insert, select, delete
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import db, archive
+from .models import BookingsNew, BookingArchive, BookingRollup, RoomsList
+
+
+def _upsert():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        stmt = postgresql.insert(BookingRollup)
+    elif dialect == 'sqlite':
+        stmt = sqlite.insert(BookingRollup)
+    else:
+        return None
+    return stmt.on_conflict_do_update(
+        index_elements=['booking_date', 'hour', 'room_id'],
+        set_={'bookings': BookingRollup.bookings + stmt.excluded.bookings}
+    )
+
+
+def record_bookings(bookings):
+    """
+    Adds new bookings to the rollup. Call before the commit that inserts
+    them so both land in the same transaction. Accepts BookingsNew objects
+    or dicts with booking_date / start_time / room_id.
+    """
+    counts = Counter()
+    for b in bookings:
+        if isinstance(b, dict):
+            key = (b['booking_date'], b['start_time'].hour, int(b['room_id']))
+        else:
+            key = (b.booking_date, b.start_time.hour, int(b.room_id))
+        counts[key] += 1
+    if not counts:
+        return
+
+    rows = [{'booking_date': d, 'hour': h, 'room_id': r, 'bookings': n} for (d, h, r), n in counts.items()]
+    stmt = _upsert()
+    if stmt is not None:
+        db.session.execute(stmt, rows)
+        return
+
+    # Other databases: update, and insert whatever wasn't there yet
+    for row in rows:
+        updated = BookingRollup.query.filter_by(
+            booking_date=row['booking_date'], hour=row['hour'], room_id=row['room_id']
+        ).update({BookingRollup.bookings: BookingRollup.bookings + row['bookings']})
+        if not updated:
+            db.session.add(BookingRollup(**row))
+
+
+def rebuild_rollup():
+    """
+    Recomputes the whole rollup from every booking, archived ones included,
+    with one INSERT ... SELECT ... GROUP BY.
+    """
+    history = archive.booking_history()
+    hour = extract('hour', history.c.start_time)
+    db.session.execute(delete(BookingRollup))
+    db.session.execute(insert(BookingRollup).from_select(
+        ['booking_date', 'hour', 'room_id', 'bookings'],
+        select(history.c.booking_date, hour, history.c.room_id, func.count(history.c.id))
+        .group_by(history.c.booking_date, hour, history.c.room_id)
+    ))
+    db.session.commit()
+
+
+def ensure_rollup():
+    """init-db: fills the rollup if it's empty but bookings exist (a database from before it)."""
+    if db.session.query(BookingRollup.hour).first() is None and (
+            db.session.query(BookingsNew.id).first() is not None or
+            db.session.query(BookingArchive.id).first() is not None):
+        rebuild_rollup()
+
+
+def daily_counts():
+    """[(date, bookings)] ordered by date."""
+    return (
+        db.session.query(BookingRollup.booking_date, func.sum(BookingRollup.bookings))
+        .group_by(BookingRollup.booking_date)
+        .order_by(BookingRollup.booking_date)
+        .all()
+    )
+
+
+def hourly_counts():
+    """[(start hour, bookings)] ordered by hour."""
+    return (
+        db.session.query(BookingRollup.hour, func.sum(BookingRollup.bookings))
+        .group_by(BookingRollup.hour)
+        .order_by(BookingRollup.hour)
+        .all()
+    )
+
+
+def top_rooms(limit=3):
+    """[(room id, room name, bookings)] for the most booked rooms."""
+    total = func.sum(BookingRollup.bookings)
+    return (
+        db.session.query(RoomsList.id.label('room_id'), RoomsList.name, total)
+        .join(BookingRollup, BookingRollup.room_id == RoomsList.id)
+        .group_by(RoomsList.id, RoomsList.name)
+        .order_by(total.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+def daily_counts_by(column):
+    """{value of column: [(date, bookings)]} - column is 'room_id' or 'hour'."""
+    key = getattr(BookingRollup, column)
+    rows = (
+        db.session.query(key, BookingRollup.booking_date, func.sum(BookingRollup.bookings))
+        .group_by(key, BookingRollup.booking_date)
+        .order_by(key, BookingRollup.booking_date)
+        .all()
+    )
+    series = {}
+    for value, day, count in rows:
+        series.setdefault(value, []).append((day, count))
+    return series
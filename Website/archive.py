@@ -0,0 +1,145 @@
+"""
+BOOKING ARCHIVE: Keeps bookings_new small by moving past bookings out.
+
+Availability, conflict checks, approvals and the dashboards almost only
+look at the current term, so bookings from before it are moved to
+bookings_archive. On PostgreSQL that table is range-partitioned by
+booking_date (one partition per year, created as needed); elsewhere it is
+a plain table with the same columns and ids.
+
+archive_bookings() moves rows in batches. Each batch copies the rows and
+deletes them from bookings_new in one transaction, so the job can be
+stopped at any point and simply picks up where it left off next time -
+whatever is still in bookings_new is what's left to do.
+
+The pages that show history read both tables:
+  - My Bookings (keyset pages over both, see pagination.keyset_page_many)
+  - analytics.rebuild_rollup, the admin dashboard counts
+  - the CSV export and room calendar feeds (exports.py)
+booking_rollup keeps its counts when rows are archived, so the forecasts
+don't change.
+
+    flask --app main archive-bookings [--before YYYY-MM-DD] [--batch-size N]
+It also runs once a day in the background.
+"""
+from datetime import date, timedelta
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, select, text, union_all
+
+from . import db, cache
+from .booking import lock_sqlite
+from .models import BookingsNew, BookingArchive, Semester
+
+JOB_NAME = 'booking-archiver'
+ARCHIVE_INTERVAL = 24 * 60 * 60  # seconds
+BATCH_SIZE = 5000
+MIN_KEEP_DAYS = 30   # never archive the last month, even right after a term starts
+KEEP_DAYS = 120      # no semester covers today: keep about a term's worth
+
+COLUMNS = ['id', 'user_id', 'room_id', 'booking_date', 'start_time', 'end_time', 'status', 'reason', 'created_at']
+
+
+def archive_cutoff(today=None):
+    """Bookings before this date get archived: the start of the current term."""
+    today = today or date.today()
+    latest = today - timedelta(days=MIN_KEEP_DAYS)
+    term_start = (db.session.query(func.min(Semester.start_date))
+                  .filter(Semester.start_date <= today, Semester.end_date >= today)
+                  .scalar())
+    if term_start is None:
+        return today - timedelta(days=KEEP_DAYS)
+    return min(term_start, latest)
+
+
+def ensure_partitions(first_day, last_day):
+    """PostgreSQL: yearly partitions covering first_day..last_day."""
+    if db.session.get_bind().dialect.name != 'postgresql':
+        return
+    for year in range(first_day.year, last_day.year + 1):
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS bookings_archive_{year} PARTITION OF bookings_archive "
+            f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+        ))
+
+
+def archive_bookings(before=None, batch_size=BATCH_SIZE, max_batches=None):
+    """
+    Moves bookings dated before `before` (default: archive_cutoff()) into
+    bookings_archive, oldest first. Commits after each batch. Returns how
+    many bookings were moved.
+    """
+    before = before or archive_cutoff()
+    # SQLite hands out max(id) + 1 for new rows, so archiving the newest id
+    # could let a new booking reuse it. Leaving that one row behind is free.
+    newest_id = db.session.query(func.max(BookingsNew.id)).scalar()
+    moved = batches = 0
+    while max_batches is None or batches < max_batches:
+        # SQLite ignores SKIP LOCKED: hold the write lock instead, so a second
+        # archiver (another worker, or the CLI) waits and then skips the moved rows
+        lock_sqlite()
+        batch = db.session.execute(
+            select(BookingsNew.id, BookingsNew.booking_date)
+            .where(BookingsNew.booking_date < before, BookingsNew.id != newest_id)
+            .order_by(BookingsNew.booking_date, BookingsNew.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)  # two workers never grab the same rows
+        ).all()
+        if not batch:
+            break
+        ids = [row.id for row in batch]
+        try:
+            ensure_partitions(batch[0].booking_date, batch[-1].booking_date)
+            db.session.execute(insert(BookingArchive).from_select(
+                COLUMNS, select(*[getattr(BookingsNew, c) for c in COLUMNS]).where(BookingsNew.id.in_(ids))
+            ))
+            db.session.execute(delete(BookingsNew).where(BookingsNew.id.in_(ids)))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        moved += len(ids)
+        batches += 1
+
+    if moved:
+        cache.bump('bookings')
+        from .occupancy import occupancy
+        occupancy.invalidate()
+    return moved
+
+
+def run_job():
+    moved = archive_bookings()
+    if moved:
+        print(f"Archived {moved} past bookings")
+
+
+# ---------------------------------------------------------
+#  READING BOTH TABLES
+# ---------------------------------------------------------
+
+def booking_history(name='booking_history'):
+    """bookings_new + bookings_archive as one subquery (UNION ALL, same columns)."""
+    return union_all(
+        select(*[getattr(BookingsNew, c) for c in COLUMNS]),
+        select(*[getattr(BookingArchive, c) for c in COLUMNS]),
+    ).subquery(name)
+
+
+@click.command('archive-bookings')
+@click.option('--before', help="Archive bookings before this date (YYYY-MM-DD). Default: start of the current term.")
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@with_appcontext
+def archive_command(before, batch_size):
+    """Moves past bookings into bookings_archive (safe to stop and re-run)."""
+    if before:
+        try:
+            before = date.fromisoformat(before)
+        except ValueError:
+            raise click.BadParameter("use YYYY-MM-DD", param_hint='--before') from None
+        if before > date.today():
+            raise click.BadParameter("can't archive future bookings", param_hint='--before')
+    before = before or archive_cutoff()
+    print(f"Archiving bookings before {before} ...")
+    print(f"{archive_bookings(before, batch_size)} bookings archived")
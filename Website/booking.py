@@ -0,0 +1,443 @@
+"""
+BOOKING CONFLICTS: Overlap checks that hold up with concurrent writers.
+
+Rules:
+  * nothing may overlap a semester class or a Confirmed booking
+  * a new Confirmed booking may not overlap a Pending request either
+  * Pending requests may overlap each other - they are competing applications
+    for the same evening slot and the admin picks one
+
+Before checking, the writer takes a lock so the check and the insert can't
+interleave with another request for the same room:
+  * PostgreSQL: the room row is locked with SELECT ... FOR UPDATE, and an
+    exclusion constraint (GiST over room + time range) backs it up at the
+    database level for Confirmed bookings
+  * SQLite: the database write lock is taken up front (BEGIN IMMEDIATE)
+"""
+from datetime import time, timedelta
+
+from sqlalchemy import DDL, event, select, insert, union_all, literal, text
+
+from . import db
+from .models import RoomsList, ClassOccurrence, BookingsNew
+
+OVERLAP_CONSTRAINT = 'bookings_new_no_overlap'
+
+
+class BookingConflict(Exception):
+    """Raised when a slot clashes with a class or another booking."""
+
+    def __init__(self, clashes):
+        self.clashes = clashes
+        super().__init__(self.describe())
+
+    def describe(self):
+        parts = []
+        for c in self.clashes:
+            label = f"Class: {c['course_name']}" if c['type'] == 'class' else f"{c['status']} booking"
+            parts.append(f"{label} ({c['date']} {c['start']} - {c['end']})")
+        return "This slot clashes with " + ", ".join(parts) + "."
+
+    def to_dict(self):
+        return {'error': 'conflict', 'message': self.describe(), 'conflicts': self.clashes}
+
+
+class InvalidRequest(ValueError):
+    """Bad input to a bulk booking / batch approval. The message is meant for the client."""
+
+
+def id_list(value, name):
+    """A JSON list of integer ids. Strings, bools, floats... raise InvalidRequest."""
+    if not isinstance(value, list) or \
+            not all(isinstance(i, int) and not isinstance(i, bool) and 0 < i < 2 ** 31 for i in value):
+        raise InvalidRequest(f"'{name}' must be a list of ids.")
+    return value
+
+
+# ---------------------------------------------------------
+#  DATABASE-LEVEL GUARD (PostgreSQL only)
+# ---------------------------------------------------------
+
+_overlap_ddl = [
+    DDL("CREATE EXTENSION IF NOT EXISTS btree_gist"),
+    DDL(f"ALTER TABLE bookings_new ADD CONSTRAINT {OVERLAP_CONSTRAINT} "
+        "EXCLUDE USING gist (room_id WITH =, "
+        "tsrange(booking_date + start_time, booking_date + end_time) WITH &&) "
+        "WHERE (status = 'Confirmed')"),
+]
+
+for _ddl in _overlap_ddl:
+    event.listen(BookingsNew.__table__, 'after_create', _ddl.execute_if(dialect='postgresql'))
+
+
+def ensure_overlap_constraint():
+    """
+    Adds the constraint to a bookings_new table that was created before it
+    existed (init-db calls this). Returns True if it was added.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return False
+    exists = db.session.execute(
+        text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {'name': OVERLAP_CONSTRAINT}
+    ).first()
+    if exists:
+        return False
+    try:
+        for ddl in _overlap_ddl:
+            db.session.execute(text(ddl.statement))
+        db.session.commit()
+        return True
+    except Exception as e:
+        # most likely old Confirmed bookings that already overlap - fix those first
+        db.session.rollback()
+        print(f"Could not add {OVERLAP_CONSTRAINT}: {e}")
+        return False
+
+
+# ---------------------------------------------------------
+#  LOCKING + CHECKS
+# ---------------------------------------------------------
+
+def lock_sqlite():
+    """SQLite only: takes the database write lock now instead of at the first INSERT."""
+    if db.session.get_bind().dialect.name != 'sqlite':
+        return False
+    raw = db.session.connection().connection.dbapi_connection
+    if not raw.in_transaction:
+        raw.execute("BEGIN IMMEDIATE")
+    return True
+
+
+def lock_rooms(room_ids):
+    """Serializes writers for these rooms until the current transaction ends."""
+    if not lock_sqlite():  # no row locks in SQLite, the whole database it is
+        db.session.execute(
+            select(RoomsList.id).where(RoomsList.id.in_(sorted(room_ids))).with_for_update()
+        )
+
+
+def blocking_statuses(include_pending):
+    return ['Confirmed', 'Pending'] if include_pending else ['Confirmed']
+
+
+def _clash(kind, row_id, room_id, on_date, start, end, detail):
+    clash = {
+        'type': kind, 'id': row_id, 'room_id': room_id, 'date': on_date.isoformat(),
+        'start': start.strftime("%H:%M"), 'end': end.strftime("%H:%M")
+    }
+    clash['course_name' if kind == 'class' else 'status'] = detail
+    return clash
+
+
+def find_conflicts_bulk(occurrences):
+    """
+    Checks many slots at once. Each occurrence is a dict with room_id,
+    booking_date, start_time, end_time and optionally include_pending /
+    ignore_id. Returns a list of clash lists, one per occurrence.
+
+    All candidate bookings and class meetings come back from ONE query (a
+    UNION ALL narrowed by rooms, dates and the overall time span); the exact
+    per-slot overlap test is then done in Python.
+    """
+    if not occurrences:
+        return []
+
+    room_ids = {int(o['room_id']) for o in occurrences}
+    dates = {o['booking_date'] for o in occurrences}
+    earliest = min(o['start_time'] for o in occurrences)
+    latest = max(o['end_time'] for o in occurrences)
+
+    candidate_bookings = select(
+        literal('booking').label('kind'), BookingsNew.id, BookingsNew.room_id,
+        BookingsNew.booking_date.label('on_date'),
+        BookingsNew.start_time, BookingsNew.end_time, BookingsNew.status.label('detail')
+    ).where(
+        BookingsNew.room_id.in_(room_ids),
+        BookingsNew.booking_date.in_(dates),
+        BookingsNew.status.in_(blocking_statuses(True)),
+        BookingsNew.start_time < latest,
+        BookingsNew.end_time > earliest
+    )
+    # class meetings report the timetable entry (schedule_id) they come from
+    candidate_classes = select(
+        literal('class'), ClassOccurrence.schedule_id, ClassOccurrence.room_id,
+        ClassOccurrence.occurrence_date,
+        ClassOccurrence.start_time, ClassOccurrence.end_time, ClassOccurrence.course_name
+    ).where(
+        ClassOccurrence.room_id.in_(room_ids),
+        ClassOccurrence.occurrence_date.in_(dates),
+        ClassOccurrence.start_time < latest,
+        ClassOccurrence.end_time > earliest
+    )
+
+    by_slot = {}   # (room, date) -> [row]
+    for row in db.session.execute(union_all(candidate_bookings, candidate_classes)):
+        by_slot.setdefault((row.room_id, row.on_date), []).append(row)
+
+    results = []
+    for o in occurrences:
+        room_id, on_date = int(o['room_id']), o['booking_date']
+        start, end = o['start_time'], o['end_time']
+        statuses = blocking_statuses(o.get('include_pending', True))
+        clashes = []
+
+        for row in by_slot.get((room_id, on_date), []):
+            if not (row.start_time < end and row.end_time > start):
+                continue
+            if row.kind == 'class':
+                clashes.append(_clash('class', row.id, room_id, on_date, row.start_time, row.end_time, row.detail))
+            elif row.detail in statuses and row.id != o.get('ignore_id'):
+                clashes.append(_clash('booking', row.id, room_id, on_date, row.start_time, row.end_time, row.detail))
+
+        clashes.sort(key=lambda c: c['start'])
+        results.append(clashes)
+    return results
+
+
+def find_conflicts(room_id, booking_date, start_time, end_time, include_pending=True, ignore_id=None):
+    """
+    Returns a list of clashes (dicts) for one slot.
+    include_pending: True for an instant (Confirmed) booking, False for a
+    Pending request or when approving one.
+    """
+    return find_conflicts_bulk([{
+        'room_id': room_id, 'booking_date': booking_date, 'start_time': start_time,
+        'end_time': end_time, 'include_pending': include_pending, 'ignore_id': ignore_id
+    }])[0]
+
+
+def check_slot(room_id, booking_date, start_time, end_time, include_pending=True, ignore_id=None):
+    """Locks the room and raises BookingConflict if the slot isn't free."""
+    lock_rooms([room_id])
+    clashes = find_conflicts(room_id, booking_date, start_time, end_time, include_pending, ignore_id)
+    if clashes:
+        raise BookingConflict(clashes)
+
+
+# ---------------------------------------------------------
+#  BULK / RECURRING BOOKINGS
+# ---------------------------------------------------------
+
+MAX_BULK_OCCURRENCES = 500
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+EVENING = time(18, 0)
+
+
+def needs_approval(start_time, end_time):
+    """The 6 PM rule: anything starting at or running past 6 PM is a Pending request."""
+    return start_time >= EVENING or end_time > EVENING
+
+
+def expand_recurrence(start_date, until=None, count=None, interval_weeks=1, weekdays=None):
+    """
+    Dates of a weekly recurrence, e.g. every Monday and Wednesday from
+    start_date until `until` (inclusive) or for `count` occurrences.
+    weekdays defaults to start_date's weekday.
+    """
+    if until is None and count is None:
+        raise InvalidRequest("Recurrence needs either 'until' or 'count'.")
+    if interval_weeks < 1:
+        raise InvalidRequest("'interval_weeks' must be at least 1.")
+
+    if weekdays:
+        if not isinstance(weekdays, (list, tuple)) or not all(isinstance(d, str) for d in weekdays):
+            raise InvalidRequest("'weekdays' must be a list of day names.")
+        unknown = [d for d in weekdays if d.strip().capitalize() not in WEEKDAYS]
+        if unknown:
+            raise InvalidRequest(f"Unknown weekday(s): {', '.join(unknown)}.")
+        day_numbers = sorted({WEEKDAYS.index(d.strip().capitalize()) for d in weekdays})
+    else:
+        day_numbers = [start_date.weekday()]
+
+    dates = []
+    week_start = start_date - timedelta(days=start_date.weekday())
+    while True:
+        for day in day_numbers:
+            d = week_start + timedelta(days=day)
+            if d < start_date:
+                continue
+            if (until is not None and d > until) or (count is not None and len(dates) >= count):
+                return dates
+            dates.append(d)
+            if len(dates) > MAX_BULK_OCCURRENCES:
+                raise InvalidRequest(f"A series can have at most {MAX_BULK_OCCURRENCES} occurrences.")
+        week_start += timedelta(weeks=interval_weeks)
+
+
+def create_bulk(user_id, occurrences, reason=None, all_or_nothing=False):
+    """
+    Books many occurrences in one transaction. Each occurrence is a dict
+    with room_id, booking_date, start_time, end_time.
+
+    Locks the rooms, makes sure they exist and are active (ValueError if
+    not), checks every occurrence with one query, then inserts
+    all accepted rows with a single multi-row INSERT. Occurrences that
+    clash with each other inside the same request are reported as
+    conflicts too. Returns (accepted, conflicts); the caller commits.
+    """
+    if len(occurrences) > MAX_BULK_OCCURRENCES:
+        raise InvalidRequest(f"At most {MAX_BULK_OCCURRENCES} occurrences per request.")
+
+    for o in occurrences:
+        o['status'] = 'Pending' if needs_approval(o['start_time'], o['end_time']) else 'Confirmed'
+        o['include_pending'] = o['status'] == 'Confirmed'
+        if o['status'] == 'Pending' and not reason:
+            raise InvalidRequest("Occurrences after 6 PM need a reason for the admin.")
+
+    room_ids = {int(o['room_id']) for o in occurrences}
+    lock_rooms(room_ids)
+    bookable = {room_id for (room_id,) in db.session.query(RoomsList.id)
+                .filter(RoomsList.id.in_(room_ids), RoomsList.is_active == True)}
+    if room_ids - bookable:
+        raise InvalidRequest("Unknown or inactive room(s): "
+                         + ", ".join(str(r) for r in sorted(room_ids - bookable)) + ".")
+    clash_lists = find_conflicts_bulk(occurrences)
+
+    accepted, conflicts = [], []
+    taken = {}  # (room, date) -> [(start, end, status)] accepted so far in this request
+    for o, clashes in zip(occurrences, clash_lists):
+        key = (int(o['room_id']), o['booking_date'])
+        for start, end, status in taken.get(key, []):
+            blocking = status == 'Confirmed' or o['include_pending']
+            if blocking and start < o['end_time'] and end > o['start_time']:
+                clashes.append({
+                    'type': 'request', 'room_id': key[0], 'date': key[1].isoformat(),
+                    'start': start.strftime("%H:%M"), 'end': end.strftime("%H:%M"), 'status': status
+                })
+        if clashes:
+            conflicts.append((o, clashes))
+        else:
+            accepted.append(o)
+            taken.setdefault(key, []).append((o['start_time'], o['end_time'], o['status']))
+
+    if all_or_nothing and conflicts:
+        return [], conflicts
+
+    if accepted:
+        rows = [{
+            'user_id': user_id,
+            'room_id': int(o['room_id']),
+            'booking_date': o['booking_date'],
+            'start_time': o['start_time'],
+            'end_time': o['end_time'],
+            'status': o['status'],
+            'reason': reason
+        } for o in accepted]
+        # One multi-row INSERT. RETURNING order isn't guaranteed, so match ids back by slot.
+        returned = db.session.execute(
+            insert(BookingsNew).returning(
+                BookingsNew.id, BookingsNew.room_id, BookingsNew.booking_date, BookingsNew.start_time
+            ), rows
+        ).all()
+        ids = {}
+        for new_id, room_id, on_date, start in returned:
+            ids.setdefault((room_id, on_date, start), []).append(new_id)
+        for o in accepted:
+            o['id'] = ids[(int(o['room_id']), o['booking_date'], o['start_time'])].pop()
+
+    return accepted, conflicts
+
+
+# ---------------------------------------------------------
+#  BATCH APPROVALS
+# ---------------------------------------------------------
+
+def apply_approvals(approve_ids, deny_ids, auto_reject_conflicts=False):
+    """
+    Approves / denies many Pending requests in one transaction.
+
+    Approvals are checked against confirmed bookings and classes (one query)
+    and against each other, in (date, start, id) order. Status changes are
+    written with one UPDATE ... WHERE id IN per outcome. With
+    auto_reject_conflicts, every other Pending request overlapping a
+    just-approved one is rejected too.
+
+    Returns (outcomes, changed_dates). outcomes has one dict per booking id:
+    {'id', 'outcome', ...} where outcome is one of approved, denied,
+    auto_rejected, conflict, not_pending, not_found, invalid. The caller commits.
+    """
+    approve_ids = set(id_list(approve_ids, 'approve'))
+    deny_ids = set(id_list(deny_ids, 'deny'))
+    outcomes = {}
+
+    for booking_id in approve_ids & deny_ids:
+        outcomes[booking_id] = {'id': booking_id, 'outcome': 'invalid',
+                                'message': 'Listed for both approval and denial.'}
+    approve_ids -= outcomes.keys()
+    deny_ids -= outcomes.keys()
+
+    rows = {r.id: r for r in db.session.query(
+        BookingsNew.id, BookingsNew.room_id, BookingsNew.booking_date,
+        BookingsNew.start_time, BookingsNew.end_time, BookingsNew.status
+    ).filter(BookingsNew.id.in_(approve_ids | deny_ids))}
+
+    for booking_id in approve_ids | deny_ids:
+        if booking_id not in rows:
+            outcomes[booking_id] = {'id': booking_id, 'outcome': 'not_found'}
+        elif rows[booking_id].status != 'Pending':
+            outcomes[booking_id] = {'id': booking_id, 'outcome': 'not_pending',
+                                    'status': rows[booking_id].status}
+
+    to_approve = sorted((rows[i] for i in approve_ids if i not in outcomes),
+                        key=lambda r: (r.booking_date, r.start_time, r.id))
+    to_deny = [i for i in deny_ids if i not in outcomes]
+
+    if to_approve:
+        lock_rooms({r.room_id for r in to_approve})
+
+    clash_lists = find_conflicts_bulk([{
+        'room_id': r.room_id, 'booking_date': r.booking_date, 'start_time': r.start_time,
+        'end_time': r.end_time, 'include_pending': False, 'ignore_id': r.id
+    } for r in to_approve])
+
+    approved = []
+    for row, clashes in zip(to_approve, clash_lists):
+        clashes += [{'type': 'booking', 'id': a.id, 'room_id': a.room_id, 'date': a.booking_date.isoformat(),
+                     'start': a.start_time.strftime("%H:%M"), 'end': a.end_time.strftime("%H:%M"),
+                     'status': 'Confirmed'}
+                    for a in approved
+                    if (a.room_id, a.booking_date) == (row.room_id, row.booking_date)
+                    and a.start_time < row.end_time and a.end_time > row.start_time]
+        if clashes:
+            outcomes[row.id] = {'id': row.id, 'outcome': 'conflict', 'conflicts': clashes}
+        else:
+            approved.append(row)
+            outcomes[row.id] = {'id': row.id, 'outcome': 'approved'}
+
+    # Other Pending requests that overlap a slot we just gave away
+    auto_rejected = {}   # id -> id of the approved booking it lost to
+    changed_dates = {a.booking_date for a in approved} | {rows[i].booking_date for i in to_deny}
+    if auto_reject_conflicts and approved:
+        approved_ids = {a.id for a in approved}
+        competitors = db.session.query(
+            BookingsNew.id, BookingsNew.room_id, BookingsNew.booking_date,
+            BookingsNew.start_time, BookingsNew.end_time
+        ).filter(
+            BookingsNew.status == 'Pending',
+            BookingsNew.room_id.in_({a.room_id for a in approved}),
+            BookingsNew.booking_date.in_({a.booking_date for a in approved}),
+            BookingsNew.id.notin_(approved_ids)
+        ).all()
+        for c in competitors:
+            for a in approved:
+                if (a.room_id, a.booking_date) == (c.room_id, c.booking_date) \
+                        and a.start_time < c.end_time and a.end_time > c.start_time:
+                    auto_rejected[c.id] = a.id
+                    break
+        for booking_id, winner in auto_rejected.items():
+            outcomes[booking_id] = {'id': booking_id, 'outcome': 'auto_rejected', 'conflicts_with': winner}
+        to_deny = [i for i in to_deny if i not in auto_rejected]
+
+    for booking_id in to_deny:
+        outcomes[booking_id] = {'id': booking_id, 'outcome': 'denied'}
+
+    if approved:
+        BookingsNew.query.filter(BookingsNew.id.in_([a.id for a in approved])) \
+            .update({BookingsNew.status: 'Confirmed'}, synchronize_session=False)
+    rejected = set(to_deny) | set(auto_rejected)
+    if rejected:
+        BookingsNew.query.filter(BookingsNew.id.in_(rejected)) \
+            .update({BookingsNew.status: 'Rejected'}, synchronize_session=False)
+
+    # auto-rejected requests share (room, date) with an approved one, so changed_dates already covers them
+    return list(outcomes.values()), changed_dates
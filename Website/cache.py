@@ -0,0 +1,85 @@
+"""
+CACHE HELPERS: Data versions and shared cached objects.
+
+Every write route bumps the version of the data it touched ('bookings',
+'messages', 'rooms'). Cached objects remember the versions they were built
+from and are rebuilt only when one of them moves (or when they get too old,
+which covers writes made by other worker processes).
+"""
+import threading
+import time as _time
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def bump(*topics):
+    """Call after committing a write that changes any of these topics."""
+    with _versions_lock:
+        for topic in topics:
+            _versions[topic] = _versions.get(topic, 0) + 1
+
+
+def version(*topics):
+    return tuple(_versions.get(topic, 0) for topic in topics)
+
+
+class VersionedValue:
+    """
+    One cached object tied to a set of topics. Concurrent callers that miss
+    at the same time wait for a single rebuild instead of each doing it.
+    """
+
+    def __init__(self, topics, max_age=60):
+        self.topics = tuple(topics)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._key = None
+        self._value = None
+        self._built_at = 0.0
+
+    def _fresh(self, key):
+        return self._key == key and _time.monotonic() - self._built_at < self.max_age
+
+    def get(self, builder, extra_key=None):
+        key = (version(*self.topics), extra_key)
+        if self._fresh(key):
+            return self._value
+        with self._lock:
+            if self._fresh(key):  # someone else rebuilt it while we waited
+                return self._value
+            value = builder()
+            self._key, self._value, self._built_at = key, value, _time.monotonic()
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._key = None
+            self._value = None
+
+
+class VersionedCache:
+    """
+    Like VersionedValue, but holds one value per key (e.g. per filter
+    combination). Keeps at most `max_entries` keys.
+    """
+
+    def __init__(self, topics, max_age=30, max_entries=128):
+        self.topics = tuple(topics)
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}  # key -> VersionedValue
+
+    def get(self, key, builder):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                entry = self._entries[key] = VersionedValue(self.topics, self.max_age)
+        return entry.get(builder)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,63 @@
+"""
+DATABASE ROUTING: Read replica for heavy read-only pages + SQLite settings.
+
+Pages decorated with @read_only (ai_insights, admin_dashboard, view_rooms)
+send their SELECTs to the 'replica' bind when one is configured
+(DATABASE_REPLICA_URL, see config.py), so they don't take connections away
+from booking writes. Anything else - writes, flushes, SELECT ... FOR UPDATE,
+background jobs - always uses the main database. Without a replica
+everything goes to the main database as before.
+
+Replicas lag a little behind the main database, so only pages where
+slightly old numbers are fine should use @read_only.
+
+SQLite connections get WAL mode (readers don't block the writer),
+a busy timeout (writers wait for the lock instead of failing straight away)
+and synchronous=NORMAL (safe with WAL, far fewer fsyncs).
+"""
+from functools import wraps
+
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+from .config import REPLICA_BIND
+
+
+def read_only(view):
+    """Marks a view as read-only: its queries may be served by the replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() and g.get('use_replica'):
+            replica = self._db.engines.get(REPLICA_BIND)
+            is_plain_select = getattr(clause, 'is_select', False) and \
+                getattr(clause, '_for_update_arg', None) is None
+            if replica is not None and is_plain_select:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def configure_sqlite(engine, busy_timeout_ms):
+    if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+
+def init_app(app, db):
+    with app.app_context():
+        for engine in db.engines.values():
+            configure_sqlite(engine, app.config.get('SQLITE_BUSY_TIMEOUT', 5000))
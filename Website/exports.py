@@ -0,0 +1,294 @@
+"""
+EXPORTS: Booking history as CSV and per-room iCalendar feeds, streamed.
+
+Nothing here loads a whole table. Rows come from the database in chunks of
+EXPORT_CHUNK (yield_per = a server-side cursor on PostgreSQL) and go
+straight out as a chunked HTTP response, so a 1M-row export needs about
+the same memory as a 1k-row one.
+
+Calendar apps poll their feeds every few minutes, so every export carries
+an ETag and a Last-Modified header. The ETag is a fingerprint of the rows
+that would be exported (count, max id and id sum per status, plus the
+room names the CSV shows and the user count, or the class meetings for
+feeds). Those are small queries that never grow with the bookings, and a client whose copy is still current
+gets a 304 without any booking rows being read. Last-Modified is the first time this worker saw that fingerprint -
+good enough for clients that only send If-Modified-Since.
+"""
+import csv
+import hashlib
+import io
+from datetime import datetime, timedelta, date
+
+from sqlalchemy import func, select
+
+from . import db
+from .models import BookingsNew, BookingArchive, RoomsList, Users, ClassOccurrence
+
+EXPORT_CHUNK = 1000
+STATUSES = ('Confirmed', 'Pending', 'Rejected')
+FEED_DAYS_BACK = 30     # default window of a room feed
+FEED_DAYS_AHEAD = 180
+MAX_FEED_DAYS = 800     # a feed can't ask for more than ~2 years of meetings
+
+# past bookings live in bookings_archive (archive.py) - exports read both, oldest first
+BOOKING_TABLES = (BookingArchive, BookingsNew)
+
+CSV_COLUMNS = ['id', 'room_id', 'room', 'user_id', 'user_email', 'date', 'start_time', 'end_time',
+               'status', 'reason', 'created_at']
+
+# fingerprint -> when this worker first saw it (for Last-Modified)
+_first_seen = {}
+_FIRST_SEEN_LIMIT = 10000
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"{name} must be YYYY-MM-DD") from None
+
+
+def booking_filters(args):
+    """?room_id=&user_id=&status=&from=&to= -> filter dict. Raises ValueError."""
+    filters = {}
+    for name in ('room_id', 'user_id'):
+        if args.get(name):
+            if not args[name].isdigit():
+                raise ValueError(f"{name} must be a number")
+            filters[name] = int(args[name])
+    if args.get('status'):
+        if args['status'] not in STATUSES:
+            raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+        filters['status'] = args['status']
+    if args.get('from'):
+        filters['from'] = _parse_date(args['from'], 'from')
+    if args.get('to'):
+        filters['to'] = _parse_date(args['to'], 'to')
+    if 'from' in filters and 'to' in filters and filters['to'] < filters['from']:
+        raise ValueError("to must be on or after from")
+    return filters
+
+
+def _where(table, filters):
+    conditions = []
+    if 'room_id' in filters:
+        conditions.append(table.room_id == filters['room_id'])
+    if 'user_id' in filters:
+        conditions.append(table.user_id == filters['user_id'])
+    if 'status' in filters:
+        conditions.append(table.status == filters['status'])
+    if 'from' in filters:
+        conditions.append(table.booking_date >= filters['from'])
+    if 'to' in filters:
+        conditions.append(table.booking_date <= filters['to'])
+    return conditions
+
+
+# ---------------------------------------------------------
+#  FINGERPRINTS (ETag / Last-Modified)
+# ---------------------------------------------------------
+
+def _booking_state(table, conditions):
+    # an approval moves an id from one status to another, so the per-status
+    # sums change even though the total count doesn't
+    return [tuple(r) for r in db.session.execute(
+        select(table.status, func.count(table.id), func.max(table.id), func.sum(table.id))
+        .where(*conditions)
+        .group_by(table.status)
+        .order_by(table.status)
+    )]
+
+
+def _class_state(room_id, start, end):
+    # materialize() rewrites the rows with new ids, so count + max id moves
+    return [tuple(r) for r in db.session.execute(
+        select(func.count(ClassOccurrence.id), func.max(ClassOccurrence.id))
+        .where(ClassOccurrence.room_id == room_id,
+               ClassOccurrence.occurrence_date.between(start, end))
+    )]
+
+
+def fingerprint(*parts):
+    """-> (etag, last_modified) for the given state rows."""
+    etag = hashlib.sha1(repr(parts).encode()).hexdigest()
+    if etag not in _first_seen:
+        if len(_first_seen) >= _FIRST_SEEN_LIMIT:
+            _first_seen.clear()  # only costs a few extra full downloads
+        _first_seen[etag] = datetime.utcnow().replace(microsecond=0)
+    return etag, _first_seen[etag]
+
+
+def _room_names_state(conditions=()):
+    # renaming a room changes the CSV without touching a single booking row, so
+    # the names go into the fingerprint too. Hashed while streaming; rooms_list
+    # is bounded by the campus (a few thousand rows at most).
+    digest = hashlib.sha1()
+    result = db.session.execute(
+        select(RoomsList.id, RoomsList.name).where(*conditions).order_by(RoomsList.id)
+        .execution_options(yield_per=EXPORT_CHUNK)
+    )
+    for room_id, name in result:
+        digest.update(f"{room_id}:{name}\n".encode())
+    return digest.hexdigest()
+
+
+def _users_state():
+    # emails are set at sign-up and never edited, so new/removed accounts are
+    # all that can change here - count + max id, one index-only aggregate
+    return tuple(db.session.execute(select(func.count(Users.id), func.max(Users.id))).one())
+
+
+def bookings_fingerprint(filters):
+    rooms = [RoomsList.id == filters['room_id']] if 'room_id' in filters else []
+    return fingerprint('bookings', sorted(filters.items()),
+                       _room_names_state(rooms), _users_state(),
+                       *[_booking_state(table, _where(table, filters)) for table in BOOKING_TABLES])
+
+
+# ---------------------------------------------------------
+#  CSV
+# ---------------------------------------------------------
+
+def _chunks(rows, buffer, write_row, size=EXPORT_CHUNK):
+    """write_row() writes into buffer; hands out the buffer once per chunk of rows."""
+    count = 0
+    for row in rows:
+        write_row(row)
+        count += 1
+        if count % size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def bookings_csv(filters):
+    """
+    Generator of CSV text chunks, by date: the archived bookings first, then
+    the current ones.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    def write_row(row):
+        writer.writerow([
+            row.id, row.room_id, row.name, row.user_id, row.email, row.booking_date.isoformat(),
+            row.start_time.strftime('%H:%M'), row.end_time.strftime('%H:%M'), row.status,
+            row.reason or '', row.created_at.isoformat(sep=' ', timespec='seconds') if row.created_at else ''
+        ])
+
+    for table in BOOKING_TABLES:
+        result = db.session.execute(
+            select(table.id, table.room_id, RoomsList.name, table.user_id, Users.email,
+                   table.booking_date, table.start_time, table.end_time,
+                   table.status, table.reason, table.created_at)
+            .join(RoomsList, RoomsList.id == table.room_id)
+            .join(Users, Users.id == table.user_id)
+            .where(*_where(table, filters))
+            .order_by(table.booking_date, table.id)
+            .execution_options(yield_per=EXPORT_CHUNK)
+        )
+        try:
+            yield from _chunks(result, buffer, write_row)
+        finally:
+            result.close()  # client went away mid-download -> release the cursor
+
+
+# ---------------------------------------------------------
+#  ICALENDAR FEEDS
+# ---------------------------------------------------------
+
+def feed_window(args, today=None):
+    """?from=&to= for a room feed, default: last 30 days .. next 180 days."""
+    today = today or date.today()
+    start = _parse_date(args['from'], 'from') if args.get('from') else today - timedelta(days=FEED_DAYS_BACK)
+    end = _parse_date(args['to'], 'to') if args.get('to') else today + timedelta(days=FEED_DAYS_AHEAD)
+    if end < start:
+        raise ValueError("to must be on or after from")
+    if (end - start).days > MAX_FEED_DAYS:
+        raise ValueError(f"a feed can cover at most {MAX_FEED_DAYS} days")
+    return start, end
+
+
+def _feed_conditions(table, room_id, start, end):
+    # Rejected requests never show up in a calendar
+    return [table.room_id == room_id, table.booking_date.between(start, end),
+            table.status.in_(('Confirmed', 'Pending'))]
+
+
+def room_feed_fingerprint(room, start, end):
+    return fingerprint('feed', room.id, room.name, start, end, _class_state(room.id, start, end),
+                       *[_booking_state(table, _feed_conditions(table, room.id, start, end))
+                         for table in BOOKING_TABLES])
+
+
+def _ics_text(value):
+    return (value or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _ics_stamp(day, moment):
+    # floating local time - the portal has no time zones
+    return datetime.combine(day, moment).strftime('%Y%m%dT%H%M%S')
+
+
+def _write_event(buffer, uid, day, start, end, summary, status, stamp):
+    buffer.write(
+        "BEGIN:VEVENT\r\n"
+        f"UID:{uid}\r\n"
+        f"DTSTAMP:{stamp}\r\n"
+        f"DTSTART:{_ics_stamp(day, start)}\r\n"
+        f"DTEND:{_ics_stamp(day, end)}\r\n"
+        f"SUMMARY:{_ics_text(summary)}\r\n"
+        f"STATUS:{status}\r\n"
+        "END:VEVENT\r\n"
+    )
+
+
+def room_calendar(room, start, end, last_modified):
+    """Generator of iCalendar text chunks: the room's bookings and class meetings."""
+    stamp = last_modified.strftime('%Y%m%dT%H%M%SZ')
+    yield ("BEGIN:VCALENDAR\r\n"
+           "VERSION:2.0\r\n"
+           "PRODID:-//Room Booking Portal//Room Calendar//EN\r\n"
+           f"X-WR-CALNAME:{_ics_text(room.name)}\r\n")
+
+    buffer = io.StringIO()
+    # No names or reasons in here - anyone with the feed link can read it
+    for table in BOOKING_TABLES:
+        bookings = db.session.execute(
+            select(table.id, table.booking_date, table.start_time, table.end_time, table.status)
+            .where(*_feed_conditions(table, room.id, start, end))
+            .order_by(table.booking_date, table.start_time)
+            .execution_options(yield_per=EXPORT_CHUNK)
+        )
+        try:
+            yield from _chunks(bookings, buffer, lambda b: _write_event(
+                buffer, f"booking-{b.id}@room-portal", b.booking_date, b.start_time, b.end_time,
+                'Booked' if b.status == 'Confirmed' else 'Booked (awaiting approval)',
+                'CONFIRMED' if b.status == 'Confirmed' else 'TENTATIVE', stamp))
+        finally:
+            bookings.close()
+
+    classes = db.session.execute(
+        select(ClassOccurrence.schedule_id, ClassOccurrence.occurrence_date, ClassOccurrence.start_time,
+               ClassOccurrence.end_time, ClassOccurrence.course_name)
+        .where(ClassOccurrence.room_id == room.id, ClassOccurrence.occurrence_date.between(start, end))
+        .order_by(ClassOccurrence.occurrence_date, ClassOccurrence.start_time)
+        .execution_options(yield_per=EXPORT_CHUNK)
+    )
+    try:
+        # schedule id + date stays the same when the calendar is re-materialized
+        yield from _chunks(classes, buffer, lambda c: _write_event(
+            buffer, f"class-{c.schedule_id}-{c.occurrence_date:%Y%m%d}@room-portal", c.occurrence_date,
+            c.start_time, c.end_time, f"Class: {c.course_name or 'Scheduled class'}", 'CONFIRMED', stamp))
+    finally:
+        classes.close()
+
+    yield "END:VCALENDAR\r\n"
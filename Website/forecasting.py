@@ -0,0 +1,119 @@
+"""
+DEMAND FORECASTING: Trains the booking demand models in the background.
+
+`train_models()` fits every model from the booking rollup and replaces the
+rows of the forecast_model table in one transaction:
+
+  * daily_trend  - bookings per day over time (prediction: bookings/day next week)
+  * peak_hour    - bookings per start hour (prediction: busiest hour, 8 AM - 8 PM)
+  * room:<id>    - bookings per day for one room (prediction: next week)
+
+It runs periodically from jobs.py; pages only read the stored rows, so no
+model is ever fitted inside a request. Each row keeps when it was trained
+and how long the fit took.
+"""
+import time as _time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, delete
+
+from . import db, analytics
+from .models import ForecastModel
+
+JOB_NAME = 'forecast-trainer'
+TRAIN_INTERVAL = 60 * 60  # seconds
+
+MIN_DAILY_BOOKINGS = 5
+MIN_HOURLY_BOOKINGS = 10
+
+
+def _fit(xs, ys):
+    """Linear regression on one feature. Returns (coef, intercept, predict)."""
+    import numpy as np
+    from sklearn.linear_model import LinearRegression
+
+    model = LinearRegression()
+    model.fit(np.array(xs, dtype=float).reshape(-1, 1), np.array(ys, dtype=float))
+    predict = lambda values: model.predict(np.array(values, dtype=float).reshape(-1, 1))
+    return float(model.coef_[0]), float(model.intercept_), predict
+
+
+def _trend_row(name, series, target_ordinal, trained_at):
+    """Fits bookings/day over time for one series of (date, count)."""
+    started = _time.perf_counter()
+    coef, intercept, predict = _fit([d.toordinal() for d, _ in series], [c for _, c in series])
+    return {
+        'name': name,
+        'coef': coef,
+        'intercept': intercept,
+        'prediction': max(0.0, float(predict([target_ordinal])[0])),
+        'samples': len(series),
+        'trained_at': trained_at,
+        'training_ms': (_time.perf_counter() - started) * 1000
+    }
+
+
+def train_models(today=None):
+    """Refits every model. Returns {'models': count, 'training_ms': total}."""
+    import sklearn.linear_model  # noqa: F401 - pay the import once, outside the timed fits
+
+    trained_at = datetime.utcnow()
+    target_ordinal = ((today or trained_at.date()) + timedelta(days=7)).toordinal()
+    rows = []
+
+    daily = analytics.daily_counts()
+    if sum(c for _, c in daily) >= MIN_DAILY_BOOKINGS:
+        rows.append(_trend_row('daily_trend', daily, target_ordinal, trained_at))
+
+    hourly = analytics.hourly_counts()
+    if sum(c for _, c in hourly) >= MIN_HOURLY_BOOKINGS:
+        started = _time.perf_counter()
+        coef, intercept, predict = _fit([h for h, _ in hourly], [c for _, c in hourly])
+        # Predict for hours 8 AM to 8 PM and keep the busiest one
+        hours = list(range(8, 21))
+        predictions = list(predict(hours))
+        rows.append({
+            'name': 'peak_hour',
+            'coef': coef,
+            'intercept': intercept,
+            'prediction': float(hours[predictions.index(max(predictions))]),
+            'samples': len(hourly),
+            'trained_at': trained_at,
+            'training_ms': (_time.perf_counter() - started) * 1000
+        })
+
+    # per-room trends for the insights page (only models a page reads are trained)
+    for room_id, series in analytics.daily_counts_by('room_id').items():
+        if len(series) >= 2:
+            rows.append(_trend_row(f'room:{room_id}', series, target_ordinal, trained_at))
+
+    db.session.execute(delete(ForecastModel))
+    if rows:
+        db.session.execute(insert(ForecastModel), rows)
+    db.session.commit()
+
+    total_ms = sum(r['training_ms'] for r in rows)
+    print(f"Forecast models trained: {len(rows)} in {total_ms:.1f} ms")
+    return {'models': len(rows), 'training_ms': total_ms}
+
+
+def get_models(*names):
+    """{name: ForecastModel} for the requested models that exist."""
+    return {m.name: m for m in ForecastModel.query.filter(ForecastModel.name.in_(names))}
+
+
+def status():
+    """How old the models are and what the last training run cost, or None if never trained."""
+    trained_at, training_ms, count = db.session.query(
+        db.func.max(ForecastModel.trained_at),
+        db.func.sum(ForecastModel.training_ms),
+        db.func.count(ForecastModel.name)
+    ).one()
+    if not count:
+        return None
+    return {
+        'trained_at': trained_at,
+        'age_minutes': int((datetime.utcnow() - trained_at).total_seconds() // 60),
+        'training_ms': round(training_ms, 1),
+        'models': count
+    }
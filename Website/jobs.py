@@ -0,0 +1,99 @@
+"""
+BACKGROUND JOBS: Small periodic worker threads started by create_app.
+
+Each job runs inside its own app context every `interval` seconds, or
+sooner when something calls `nudge(name)` (e.g. right after a write the
+job should react to). Errors are printed and the job keeps going.
+
+create_app only starts them when the app serves its first request, so
+`flask --app main <command>` (which loads the same app) never runs them.
+
+Under gunicorn every worker process starts the same jobs, but each run
+first takes the job's row in job_lease: only the process holding an
+unexpired lease does the work, the others skip that round. The holder
+renews the lease every run; if it dies, another worker takes over once
+the lease expires. nudge() only wakes the job in its own process, so a
+nudge from a worker that doesn't hold the lease waits for the holder's
+next round.
+"""
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import JobLease
+
+_wakeups = {}
+_start_lock = threading.Lock()
+HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+MIN_LEASE = 10 * 60  # seconds - longer than any single run should take
+
+
+def take_lease(name, seconds):
+    """True if this process may run `name` now (it holds or just took the lease)."""
+    now = datetime.utcnow()
+    expires = now + timedelta(seconds=seconds)
+    renewed = (JobLease.query
+               .filter(JobLease.name == name, or_(JobLease.holder == HOLDER, JobLease.expires_at < now))
+               .update({JobLease.holder: HOLDER, JobLease.expires_at: expires}, synchronize_session=False))
+    if renewed:
+        db.session.commit()
+        return True
+    db.session.rollback()
+    try:  # first run anywhere: no row yet
+        db.session.add(JobLease(name=name, holder=HOLDER, expires_at=expires))
+        db.session.commit()
+        return True
+    except IntegrityError:  # someone else holds it
+        db.session.rollback()
+        return False
+
+
+def start_periodic(app, name, interval, job):
+    with _start_lock:
+        if name in _wakeups:
+            return  # already running in this process
+        wake = threading.Event()
+        _wakeups[name] = wake
+
+    lease = max(2 * interval, MIN_LEASE)
+
+    def run():
+        while True:
+            with app.app_context():
+                try:
+                    if take_lease(name, lease):
+                        job()
+                except Exception as e:
+                    print(f"Background job '{name}' failed: {e}")
+                    db.session.rollback()
+                finally:
+                    db.session.remove()
+            wake.wait(interval)
+            wake.clear()
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+
+
+def start_on_first_request(app, jobs):
+    """jobs = [(name, interval, job)], started when the app handles its first request."""
+    started = threading.Event()
+
+    @app.before_request
+    def start_jobs():
+        if started.is_set():
+            return
+        for name, interval, job in jobs:
+            start_periodic(app, name, interval, job)
+        started.set()
+
+
+def nudge(name):
+    """Wakes a job up early. Does nothing if the job isn't running."""
+    wake = _wakeups.get(name)
+    if wake is not None:
+        wake.set()
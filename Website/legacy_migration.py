@@ -0,0 +1,265 @@
+"""
+LEGACY MIGRATION: Moves the old Rooms / RoomTimeslot / Bookings data into
+RoomsList / BookingsNew.
+
+The old schema booked a RoomTimeslot (a weekday + a TimeSlot row) on a
+date. The new one stores the times on the booking itself, so every old
+booking becomes one BookingsNew row: its date, the start/end of its
+TimeSlot, and its status mapped onto Confirmed / Pending / Rejected.
+
+Two steps, each read in fixed-size batches by primary key:
+  rooms     Rooms -> RoomsList (an existing room with the same name is
+            reused), remembered in legacy_room_map
+  bookings  Bookings + RoomTimeslot + TimeSlot -> BookingsNew, one
+            executemany INSERT per batch
+Every batch commits together with its row in migration_checkpoint, so the
+tool can be killed at any moment and re-run: it carries on after the last
+committed batch and never copies a row twice. Each batch starts by locking
+that checkpoint row (FOR UPDATE; the write lock on SQLite), so a second run
+started alongside waits and then picks up after the first one's batch
+instead of copying the same rows. Each transaction only holds one batch,
+so the old and new tables stay usable while it runs, and only the batch
+plus the room map are in memory.
+
+Not copied: Bookings_stats (booking_rollup is rebuilt from the migrated
+bookings instead) and Admin_approvals (the booking's own status already
+says how it was decided; BookingsNew has no reviewer column).
+Bookings whose slot or room is missing are skipped and counted, and so are
+confirmed bookings that would overlap a confirmed one already in
+bookings_new: on PostgreSQL the bookings_new_no_overlap constraint drops
+them, elsewhere booking.find_conflicts_bulk checks each batch first.
+
+Old bookings usually end up before the current term; the archival job
+(archive.py) moves them on to bookings_archive afterwards.
+
+    flask --app main migrate-legacy [--batch-size N] [--max-batches N]
+"""
+import time as _time
+from datetime import datetime
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
+
+from . import db, cache, analytics
+from .booking import find_conflicts_bulk, lock_sqlite
+from .models import (Rooms, TimeSlot, RoomTimeslot, Bookings, RoomsList, BookingsNew,
+                     MigrationCheckpoint, LegacyRoomMap)
+
+BATCH_SIZE = 2000
+STEPS = ('rooms', 'bookings')
+
+# old free-text statuses -> the three the new system knows
+STATUS_MAP = {
+    'confirmed': 'Confirmed', 'approved': 'Confirmed', 'booked': 'Confirmed', 'completed': 'Confirmed',
+    'pending': 'Pending', 'requested': 'Pending',
+    'rejected': 'Rejected', 'denied': 'Rejected', 'cancelled': 'Rejected', 'canceled': 'Rejected',
+}
+
+
+def new_status(old):
+    return STATUS_MAP.get((old or '').strip().lower(), 'Pending')
+
+
+def checkpoint(step):
+    point = db.session.get(MigrationCheckpoint, step)
+    if point is None:
+        try:
+            db.session.add(MigrationCheckpoint(step=step, last_id=0, migrated=0, skipped=0))
+            db.session.commit()
+        except IntegrityError:  # another run created it first
+            db.session.rollback()
+        point = db.session.get(MigrationCheckpoint, step)
+    return point
+
+
+def _lock(step):
+    """
+    Locks the checkpoint row until the batch commits and re-reads it, so two
+    runs never work from the same last_id.
+    """
+    lock_sqlite()
+    return db.session.get(MigrationCheckpoint, step, with_for_update=True, populate_existing=True)
+
+
+def _save(point, last_id, migrated, skipped):
+    point.last_id = last_id
+    point.migrated += migrated
+    point.skipped += skipped
+    point.updated_at = datetime.utcnow()
+    db.session.commit()  # the batch and its checkpoint land together
+
+
+# ---------------------------------------------------------
+#  STEP 1: ROOMS
+# ---------------------------------------------------------
+
+def migrate_rooms_batch(point, batch_size):
+    """Returns how many legacy rooms were read (0 = done)."""
+    rooms = (Rooms.query.filter(Rooms.room_id > point.last_id)
+             .order_by(Rooms.room_id).limit(batch_size).all())
+    if not rooms:
+        return 0
+
+    mapped = {legacy for (legacy,) in db.session.query(LegacyRoomMap.legacy_room_id)
+              .filter(LegacyRoomMap.legacy_room_id.in_([r.room_id for r in rooms]))}
+    existing = dict(db.session.query(RoomsList.name, RoomsList.id)
+                    .filter(RoomsList.name.in_([r.room_name for r in rooms]))
+                    .order_by(RoomsList.id.desc()))  # oldest wins for duplicate names
+    links = []
+    for room in rooms:
+        if room.room_id in mapped:
+            continue
+        room_id = existing.get(room.room_name)
+        if room_id is None:
+            room_id = db.session.execute(insert(RoomsList).values(
+                name=room.room_name[:50], capacity=room.capacity, location=room.location,
+                amenities=room.amenities, is_active=room.is_available
+            )).inserted_primary_key[0]
+            existing[room.room_name] = room_id
+        links.append({'legacy_room_id': room.room_id, 'room_id': room_id})
+    if links:
+        db.session.execute(insert(LegacyRoomMap), links)
+    _save(point, rooms[-1].room_id, len(links), 0)
+    return len(rooms)
+
+
+# ---------------------------------------------------------
+#  STEP 2: BOOKINGS
+# ---------------------------------------------------------
+
+def _booking_insert():
+    table = BookingsNew.__table__
+    if db.session.get_bind().dialect.name == 'postgresql':
+        # skip confirmed bookings that clash with one already in bookings_new
+        stmt = postgresql.insert(table).on_conflict_do_nothing()
+    else:
+        stmt = insert(table)
+    # RETURNING tells us how many rows really went in (batched by SQLAlchemy)
+    return stmt.returning(table.c.id)
+
+
+def _without_overlaps(rows):
+    """
+    What bookings_new_no_overlap does on PostgreSQL: drops the Confirmed rows
+    that overlap a Confirmed booking already in bookings_new or earlier in
+    the batch.
+    """
+    confirmed = [row for row in rows if row['status'] == 'Confirmed']
+    clash_lists = find_conflicts_bulk([dict(row, include_pending=False) for row in confirmed])
+    dropped, taken = set(), {}  # taken: (room, date) -> [(start, end)] kept so far
+    for row, clashes in zip(confirmed, clash_lists):
+        key = (row['room_id'], row['booking_date'])
+        if any(c['type'] == 'booking' for c in clashes) or \
+                any(start < row['end_time'] and end > row['start_time'] for start, end in taken.get(key, [])):
+            dropped.add(id(row))
+        else:
+            taken.setdefault(key, []).append((row['start_time'], row['end_time']))
+    return [row for row in rows if id(row) not in dropped]
+
+
+def migrate_bookings_batch(point, batch_size, room_map):
+    """Returns how many legacy bookings were read (0 = done)."""
+    # outer joins so a booking with a dangling slot still shows up (and gets skipped)
+    batch = (
+        db.session.query(Bookings.booking_id, Bookings.user_id, Bookings.r_id, Bookings.booking_date,
+                         Bookings.status, Bookings.check_in_time, TimeSlot.start_time, TimeSlot.end_time)
+        .outerjoin(RoomTimeslot, RoomTimeslot.id == Bookings.room_timeslot_id)
+        .outerjoin(TimeSlot, TimeSlot.id == RoomTimeslot.timeslot_id)
+        .filter(Bookings.booking_id > point.last_id)
+        .order_by(Bookings.booking_id)
+        .limit(batch_size)
+        .all()
+    )
+    if not batch:
+        return 0
+
+    rows, skipped = [], 0
+    for b in batch:
+        room_id = room_map.get(b.r_id)
+        if room_id is None or b.start_time is None or b.booking_date is None or b.end_time <= b.start_time:
+            skipped += 1
+            continue
+        rows.append({
+            'user_id': b.user_id, 'room_id': room_id, 'booking_date': b.booking_date,
+            'start_time': b.start_time, 'end_time': b.end_time, 'status': new_status(b.status),
+            'reason': None, 'created_at': b.check_in_time
+        })
+
+    migrated = 0
+    if rows:
+        new_rows = rows if db.session.get_bind().dialect.name == 'postgresql' else _without_overlaps(rows)
+        if new_rows:
+            migrated = len(db.session.execute(_booking_insert(), new_rows).all())
+        skipped += len(rows) - migrated
+    _save(point, batch[-1].booking_id, migrated, skipped)
+    return len(batch)
+
+
+# ---------------------------------------------------------
+#  RUNNER
+# ---------------------------------------------------------
+
+def migrate(batch_size=BATCH_SIZE, max_batches=None, log=print):
+    """
+    Runs (or resumes) both steps. max_batches limits the batches per call,
+    e.g. to spread the work over several quiet periods.
+    Returns {step: checkpoint} for the steps that ran.
+    """
+    batches = 0
+    moved_bookings = False
+    for step in STEPS:
+        point = checkpoint(step)
+        if point.finished_at is not None:
+            continue
+        room_map = dict(db.session.query(LegacyRoomMap.legacy_room_id, LegacyRoomMap.room_id)) \
+            if step == 'bookings' else None
+
+        started, done_before = _time.perf_counter(), point.migrated
+        while max_batches is None or batches < max_batches:
+            point = _lock(step)
+            if point.finished_at is not None:  # another run finished this step meanwhile
+                db.session.commit()
+                break
+            if step == 'rooms':
+                read = migrate_rooms_batch(point, batch_size)
+            else:
+                read = migrate_bookings_batch(point, batch_size, room_map)
+            if not read:
+                point.finished_at = datetime.utcnow()
+                db.session.commit()
+                break
+            batches += 1
+            elapsed = _time.perf_counter() - started
+            rate = (point.migrated - done_before) / elapsed if elapsed else 0
+            log(f"  {step}: up to id {point.last_id}, {point.migrated} migrated, "
+                f"{point.skipped} skipped ({rate:,.0f} rows/s)")
+        if step == 'bookings' and point.migrated > done_before:
+            moved_bookings = True
+        if point.finished_at is None:
+            break  # out of batches for this run
+
+    if moved_bookings:
+        analytics.rebuild_rollup()
+        from .occupancy import occupancy
+        occupancy.invalidate()
+    cache.bump('bookings', 'rooms')
+    return {step: db.session.get(MigrationCheckpoint, step) for step in STEPS}
+
+
+@click.command('migrate-legacy')
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@click.option('--max-batches', type=int, help="Stop after this many batches (run again to continue).")
+@with_appcontext
+def migrate_command(batch_size, max_batches):
+    """Copies the old Rooms/Bookings tables into RoomsList/BookingsNew (resumable)."""
+    points = migrate(batch_size, max_batches)
+    for step in STEPS:
+        point = points.get(step)
+        if point is None:
+            print(f"{step}: not started")
+            continue
+        state = 'done' if point.finished_at else f'paused after id {point.last_id}'
+        print(f"{step}: {state} - {point.migrated} migrated, {point.skipped} skipped")
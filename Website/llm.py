@@ -0,0 +1,251 @@
+"""
+LLM CALL LAYER: Every Gemini call in the app goes through `generate()`.
+
+  * Responses are cached (TTL + LRU) keyed on the normalized prompt and the
+    version of the data the prompt was built from.
+  * Identical calls that arrive while one is already in flight wait for it
+    instead of hitting Gemini again (single-flight).
+  * hits / misses / coalesced / errors are counted in `stats`, and every
+    upstream call reports its latency to metrics.py.
+
+The model is injectable (`set_model`) so tests and benchmarks can swap in a
+local stub: any object with `generate_content(prompt)` returning something
+with a `.text` attribute works. For `stream()` the stub must also accept
+`stream=True, request_options=...` and return an iterable of such chunks.
+"""
+import hashlib
+import os
+import threading
+import time as _time
+from collections import OrderedDict
+
+from . import metrics
+
+MODEL_NAME = 'models/gemini-2.5-flash-lite'
+
+_model = None
+_model_lock = threading.Lock()
+
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                import google.generativeai as genai
+                from dotenv import load_dotenv
+                load_dotenv()
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+                _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+
+def set_model(model):
+    """Replaces the Gemini model (e.g. with a stub) and drops cached replies."""
+    global _model
+    _model = model
+    response_cache.clear()
+
+
+def _call_model(prompt):
+    started = _time.perf_counter()
+    try:
+        text = get_model().generate_content(prompt).text
+    except Exception:
+        metrics.observe_llm('generate', _time.perf_counter() - started, failed=True)
+        raise
+    metrics.observe_llm('generate', _time.perf_counter() - started)
+    return text
+
+
+def normalize_prompt(prompt):
+    # Same wording with different indentation / spacing should share a cache slot
+    return " ".join(prompt.split())
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class LLMCache:
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (stored_at, text)
+        self._in_flight = {}            # key -> _Flight
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'errors': 0}
+
+    @staticmethod
+    def make_key(prompt, data_version=None):
+        raw = f"{data_version!r}|{normalize_prompt(prompt)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if _time.monotonic() - entry[0] >= self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def peek(self, prompt, data_version=None):
+        """Cached reply or None - never calls the model."""
+        with self._lock:
+            return self._lookup(self.make_key(prompt, data_version))
+
+    def store(self, prompt, text, data_version=None):
+        with self._lock:
+            self._store(self.make_key(prompt, data_version), text)
+
+    def _store(self, key, text):
+        self._entries[key] = (_time.monotonic(), text)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def generate(self, prompt, data_version=None, call=None):
+        """
+        Returns the reply text for `prompt`. `call(prompt)` does the actual
+        upstream request (defaults to the Gemini model). Errors propagate to
+        every waiting caller and are not cached.
+        """
+        key = self.make_key(prompt, data_version)
+
+        with self._lock:
+            text = self._lookup(key)
+            if text is not None:
+                self.stats['hits'] += 1
+                return text
+            flight = self._in_flight.get(key)
+            if flight is not None:
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                self.stats['misses'] += 1
+                flight = self._in_flight[key] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            if call is None:
+                call = _call_model
+            flight.result = call(prompt)
+            with self._lock:
+                self._store(key, flight.result)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            flight.done.set()
+
+    def count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+response_cache = LLMCache()
+
+
+def generate(prompt, data_version=None):
+    """Cached, coalesced Gemini call. Raises if the model call fails."""
+    return response_cache.generate(prompt, data_version)
+
+
+class StreamTimeout(Exception):
+    pass
+
+
+class BlockedReply(Exception):
+    """Gemini stopped the reply (safety filter etc.) part-way through a stream."""
+
+
+# finish reasons that mean "the rest of the answer was withheld"
+BLOCKED_REASONS = {'SAFETY', 'RECITATION', 'BLOCKLIST', 'PROHIBITED_CONTENT', 'SPII'}
+
+
+def _chunk_text(chunk):
+    """
+    Text of one streamed chunk, '' for chunks without any (e.g. the final
+    finish-only one). chunk.text raises ValueError for those rather than
+    returning '', and for a blocked reply - that one becomes BlockedReply.
+    """
+    try:
+        return chunk.text or ''
+    except AttributeError:
+        return ''
+    except ValueError:
+        for candidate in getattr(chunk, 'candidates', None) or []:
+            reason = getattr(candidate, 'finish_reason', None)
+            if getattr(reason, 'name', reason) in BLOCKED_REASONS:
+                raise BlockedReply(f"Gemini stopped the reply ({getattr(reason, 'name', reason)})") from None
+        feedback = getattr(chunk, 'prompt_feedback', None)
+        if getattr(feedback, 'block_reason', None):
+            raise BlockedReply("Gemini blocked the prompt") from None
+        return ''
+
+
+def stream(prompt, data_version=None, timeout=30):
+    """
+    Yields the reply in chunks as Gemini generates it.
+
+    A cached reply is yielded in one piece. A finished stream is stored in
+    the cache so the non-streaming path can reuse it. `timeout` bounds both
+    the upstream request and the total generation time. If the consumer
+    stops early (e.g. the browser disconnected and the WSGI server closed
+    the generator) the upstream stream is dropped and nothing is cached.
+    """
+    cached = response_cache.peek(prompt, data_version)
+    if cached is not None:
+        response_cache.count('hits')
+        yield cached
+        return
+
+    response_cache.count('misses')
+
+    deadline = _time.monotonic() + timeout
+    started = _time.perf_counter()
+    response = None
+    parts = []
+    finished = False
+    try:
+        response = get_model().generate_content(prompt, stream=True, request_options={'timeout': timeout})
+        for chunk in response:
+            text = _chunk_text(chunk)
+            if text:
+                parts.append(text)
+                yield text
+            if _time.monotonic() > deadline:
+                raise StreamTimeout(f"generation took longer than {timeout}s")
+        finished = True
+    except Exception:
+        response_cache.count('errors')
+        metrics.observe_llm('stream', _time.perf_counter() - started, failed=True)
+        raise
+    finally:
+        if finished:
+            metrics.observe_llm('stream', _time.perf_counter() - started)
+            response_cache.store(prompt, "".join(parts), data_version)
+        elif response is not None:
+            close = getattr(response, 'close', None)
+            if close:
+                close()
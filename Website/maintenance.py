@@ -0,0 +1,166 @@
+"""
+AI MAINTENANCE CLASSIFIER: Tags each contact message with a category and
+whether it is a critical facility issue.
+
+Runs in the background (see jobs.py) over messages that have no
+MessageClassification row yet, a batch at a time. Each batch is sent to
+Gemini as one prompt; if Gemini is unavailable or answers with something we
+can't parse, a local TF-IDF model (scikit-learn) classifies the batch
+instead. The admin page then only reads the stored results.
+"""
+import json
+import threading
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from . import db, llm
+from .models import Messages, MessageClassification
+
+JOB_NAME = 'message-classifier'
+BATCH_SIZE = 50
+
+CATEGORIES = ['Facility Issue', 'Safety Hazard', 'IT / Network', 'Booking Question', 'General Feedback']
+CRITICAL_CATEGORIES = {'Facility Issue', 'Safety Hazard', 'IT / Network'}
+
+# Seed examples for the offline model. Short on purpose - they only need to
+# pull the vocabulary of each category apart.
+_TRAINING_EXAMPLES = [
+    ("The projector in the lab is broken", 'Facility Issue'),
+    ("AC is not working in room 204, it's way too hot", 'Facility Issue'),
+    ("There is a leak from the ceiling near the whiteboard", 'Facility Issue'),
+    ("Chairs are damaged and the desk is faulty", 'Facility Issue'),
+    ("The lights keep flickering and the speaker is dead", 'Facility Issue'),
+    ("The smart board won't turn on", 'Facility Issue'),
+    ("Exposed wires next to the socket, someone could get hurt", 'Safety Hazard'),
+    ("Fire exit is blocked by boxes", 'Safety Hazard'),
+    ("Water on the floor, very slippery, dangerous", 'Safety Hazard'),
+    ("Smell of gas / smoke in the corridor", 'Safety Hazard'),
+    ("Wifi keeps disconnecting in the library", 'IT / Network'),
+    ("Internet is down and the lab computers won't log in", 'IT / Network'),
+    ("Network is really slow, can't load anything", 'IT / Network'),
+    ("The PCs in the lab need a software update, login fails", 'IT / Network'),
+    ("How do I book a room after 6 PM?", 'Booking Question'),
+    ("My booking request is still pending, when will it be approved?", 'Booking Question'),
+    ("Can I cancel my reservation for tomorrow?", 'Booking Question'),
+    ("Is room 101 available on Friday afternoon?", 'Booking Question'),
+    ("Great rooms, thanks for the new system!", 'General Feedback'),
+    ("The new study space is really nice and quiet", 'General Feedback'),
+    ("Love the chatbot, super helpful", 'General Feedback'),
+    ("Please add more plants to the lounge", 'General Feedback'),
+]
+
+_local_model = None
+_local_model_lock = threading.Lock()
+
+
+def _get_local_model():
+    global _local_model
+    if _local_model is None:
+        with _local_model_lock:
+            if _local_model is None:
+                from sklearn.feature_extraction.text import TfidfVectorizer
+                from sklearn.linear_model import LogisticRegression
+                from sklearn.pipeline import make_pipeline
+
+                texts, labels = zip(*_TRAINING_EXAMPLES)
+                pipeline = make_pipeline(
+                    TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, lowercase=True),
+                    LogisticRegression(max_iter=1000, C=10)
+                )
+                pipeline.fit(texts, labels)
+                _local_model = pipeline
+    return _local_model
+
+
+def classify_locally(messages):
+    """Vectorizes the whole batch at once. Returns {message_id: category}."""
+    if not messages:
+        return {}
+    predicted = _get_local_model().predict([content for _, content in messages])
+    return {msg_id: category for (msg_id, _), category in zip(messages, predicted)}
+
+
+def classify_with_gemini(messages):
+    """Returns {message_id: category} or raises if the reply can't be used."""
+    batch_text = "\n".join(f"ID: {msg_id} | Content: {content}" for msg_id, content in messages)
+    prompt = f"""
+    Classify each student message below into exactly one of these categories:
+    {", ".join(CATEGORIES)}.
+    Reply with JSON only, a list like [{{"id": 1, "category": "Facility Issue"}}].
+    Messages:
+    {batch_text}
+    """
+    reply = llm.generate(prompt).strip()
+    if reply.startswith("```"):
+        reply = reply.strip("`").removeprefix("json").strip()
+
+    wanted = {msg_id for msg_id, _ in messages}
+    result = {}
+    for item in json.loads(reply):
+        msg_id, category = int(item['id']), item['category']
+        if msg_id in wanted and category in CATEGORIES:
+            result[msg_id] = category
+    if not result:
+        raise ValueError("Gemini reply had no usable classifications")
+    return result
+
+
+def classify_pending(batch_size=BATCH_SIZE, use_gemini=True):
+    """
+    Classifies every message that doesn't have a classification yet.
+    Commits after each batch, so it can be stopped and resumed at any point.
+    Returns how many messages were classified.
+    """
+    done = 0
+    while True:
+        batch = (
+            db.session.query(Messages.id, Messages.content)
+            .outerjoin(MessageClassification, MessageClassification.message_id == Messages.id)
+            .filter(MessageClassification.message_id.is_(None))
+            .order_by(Messages.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not batch:
+            return done
+
+        categories, source = {}, 'local'
+        if use_gemini:
+            try:
+                categories, source = classify_with_gemini(batch), 'gemini'
+            except Exception as e:
+                print(f"AI Maintenance Error (falling back to local model): {e}")
+
+        # anything Gemini skipped goes through the local model
+        labels = classify_locally([m for m in batch if m[0] not in categories])
+        labels.update(categories)
+
+        now = datetime.utcnow()
+        db.session.execute(insert(MessageClassification), [{
+            'message_id': msg_id,
+            'category': labels[msg_id],
+            'is_critical': labels[msg_id] in CRITICAL_CATEGORIES,
+            'source': source if msg_id in categories else 'local',
+            'classified_at': now
+        } for msg_id, _ in batch])
+        db.session.commit()
+        done += len(batch)
+
+
+def critical_alerts():
+    """Unseen messages flagged as critical, newest first - one indexed join."""
+    rows = (
+        db.session.query(Messages.id, Messages.name, Messages.content, MessageClassification.category)
+        .join(MessageClassification, MessageClassification.message_id == Messages.id)
+        .filter(MessageClassification.is_critical == True, Messages.seen == False)
+        .order_by(Messages.timestamp.desc())
+        .all()
+    )
+    return [{
+        'is_critical': True,
+        'content': content,
+        'sender_name': name,
+        'id': msg_id,
+        'category': category
+    } for msg_id, name, content, category in rows]
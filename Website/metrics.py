@@ -0,0 +1,227 @@
+"""
+METRICS: Where does the time go? Per-request timings, SQL and Gemini calls.
+
+Hooked into the app by create_app (init_app). For every request we record:
+  * the latency, per endpoint (histogram) and the response status
+  * how many SQL statements it sent and how long they took (engine events)
+Gemini calls made through llm.py report their latency and errors here too.
+
+Everything lives in memory in this process and is served in Prometheus text
+format at /admin/metrics (see views.py). Requests slower than
+SLOW_REQUEST_MS (default 500) are printed with their slowest SQL statements
+and any statement repeated many times (usually an N+1 loop).
+"""
+import heapq
+import os
+import threading
+import time as _time
+from urllib.parse import urlencode
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from . import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+SLOW_LOG_STATEMENTS = 5   # slowest statements shown per slow request
+REPEATED_STATEMENT = 10   # a statement sent this often in one request gets called out
+SECRET_PARAMS = {'token'}  # query parameters masked in the slow-request log
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels, buckets):
+        self.name, self.help_text, self.labels, self.buckets = name, help_text, labels, buckets
+        self.series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, label_values, value):
+        row = self.series.get(label_values)
+        if row is None:
+            row = self.series[label_values] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, row in sorted(self.series.items()):
+            labels = _labels(self.labels, label_values)
+            for bound, count in zip(self.buckets, row):
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound:g}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {row[-1]}')
+            lines.append(f'{self.name}_sum{{{labels}}} {row[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {row[-1]}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labels):
+        self.name, self.help_text, self.labels = name, help_text, labels
+        self.series = {}
+
+    def inc(self, label_values, amount=1):
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels, label_values)}}} {value:g}")
+        return lines
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+
+
+_lock = threading.Lock()
+
+request_latency = Histogram('portal_request_duration_seconds', 'Time to build the response, per endpoint.',
+                            ('endpoint', 'method'), LATENCY_BUCKETS)
+requests_total = Counter('portal_requests_total', 'Requests handled, per endpoint and status.',
+                         ('endpoint', 'method', 'status'))
+request_queries = Histogram('portal_request_sql_statements', 'SQL statements sent per request.',
+                            ('endpoint',), QUERY_BUCKETS)
+request_sql_time = Counter('portal_request_sql_seconds_total', 'Time spent waiting on SQL, per endpoint.',
+                           ('endpoint',))
+llm_latency = Histogram('portal_llm_request_duration_seconds', 'Gemini generate_content latency.',
+                        ('operation',), LATENCY_BUCKETS)
+llm_errors = Counter('portal_llm_errors_total', 'Failed Gemini calls.', ('operation',))
+
+_metrics = [request_latency, requests_total, request_queries, request_sql_time, llm_latency, llm_errors]
+
+
+# =========================================================
+#  RECORDING
+# =========================================================
+
+def observe_llm(operation, seconds, failed=False):
+    """Called by llm.py after every upstream Gemini call."""
+    with _lock:
+        llm_latency.observe((operation,), seconds)
+        if failed:
+            llm_errors.inc((operation,))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_started', []).append(_time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['metrics_started'].pop()
+    if has_request_context() and 'metrics_sql' in g:
+        _record_statement(statement, _time.perf_counter() - started)
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    if conn is not None and conn.info.get('metrics_started'):
+        started = conn.info['metrics_started'].pop()
+        if has_request_context() and 'metrics_sql' in g:
+            _record_statement(exception_context.statement or '', _time.perf_counter() - started)
+
+
+def _record_statement(statement, seconds):
+    sql = g.metrics_sql
+    sql['count'] += 1
+    sql['seconds'] += seconds
+    sql['repeats'][statement] = sql['repeats'].get(statement, 0) + 1
+    # keep only the slowest few, with a counter as tie-breaker so strings are never compared
+    entry = (seconds, sql['count'], statement)
+    if len(sql['slowest']) < SLOW_LOG_STATEMENTS:
+        heapq.heappush(sql['slowest'], entry)
+    else:
+        heapq.heappushpop(sql['slowest'], entry)
+
+
+def instrument_engine(engine):
+    if not event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(engine, 'handle_error', _handle_error)
+
+
+def _start_request():
+    g.metrics_started = _time.perf_counter()
+    g.metrics_sql = {'count': 0, 'seconds': 0.0, 'slowest': [], 'repeats': {}}
+
+
+def _remember_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def _finish_request(app, error):
+    if 'metrics_started' not in g:
+        return
+    elapsed = _time.perf_counter() - g.metrics_started
+    status = 500 if error is not None else g.get('metrics_status', 500)
+    endpoint = request.endpoint or 'unmatched'
+    sql = g.metrics_sql
+
+    with _lock:
+        request_latency.observe((endpoint, request.method), elapsed)
+        requests_total.inc((endpoint, request.method, status))
+        request_queries.observe((endpoint,), sql['count'])
+        request_sql_time.inc((endpoint,), sql['seconds'])
+
+    if elapsed * 1000 >= app.config['SLOW_REQUEST_MS']:
+        _log_slow_request(elapsed, status, sql)
+
+
+def _logged_path():
+    # the room calendar feeds take a shared secret as ?token= (exports.py) - keep it out of the logs
+    if not request.args:
+        return request.path
+    query = urlencode([(name, '***' if name in SECRET_PARAMS else value)
+                       for name, value in request.args.items(multi=True)])
+    return f"{request.path}?{query}"
+
+
+def _log_slow_request(elapsed, status, sql):
+    lines = [f"SLOW REQUEST: {request.method} {_logged_path()} took {elapsed * 1000:.0f} ms "
+             f"(status {status}) - {sql['count']} SQL statements, {sql['seconds'] * 1000:.0f} ms in SQL"]
+    for seconds, _, statement in sorted(sql['slowest'], reverse=True):
+        lines.append(f"    {seconds * 1000:8.1f} ms  {_short(statement)}")
+    for statement, times in sql['repeats'].items():
+        if times >= REPEATED_STATEMENT:
+            lines.append(f"    sent {times}x (N+1?)  {_short(statement)}")
+    print("\n".join(lines))
+
+
+def _short(statement, limit=300):
+    flat = " ".join(statement.split())
+    return flat if len(flat) <= limit else flat[:limit] + "..."
+
+
+# =========================================================
+#  SETUP + EXPORT
+# =========================================================
+
+def init_app(app):
+    app.config.setdefault('SLOW_REQUEST_MS', int(os.getenv('SLOW_REQUEST_MS', 500)))
+    app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN'))
+
+    with app.app_context():
+        for engine in db.engines.values():
+            instrument_engine(engine)
+
+    app.before_request(_start_request)
+    app.after_request(_remember_status)
+    app.teardown_request(lambda error: _finish_request(app, error))
+
+
+def render():
+    """Everything recorded so far, in Prometheus text format."""
+    from . import llm
+
+    with _lock:
+        lines = []
+        for metric in _metrics:
+            lines.extend(metric.render())
+        lines.append("# HELP portal_llm_cache_events_total Gemini reply cache hits / misses / coalesced calls / errors.")
+        lines.append("# TYPE portal_llm_cache_events_total counter")
+        for result, count in sorted(llm.response_cache.stats.items()):
+            lines.append(f'portal_llm_cache_events_total{{result="{result}"}} {count}')
+    return "\n".join(lines) + "\n"
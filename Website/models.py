@@ -7,9 +7,17 @@ class Messages(db.Model):
     name = db.Column(db.String(150), nullable=False)
     email = db.Column(db.String(150), nullable=False)
     content = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # NOT NULL: the message list pages by (timestamp, id); init-db backfills older rows
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     seen = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        # unseen messages, newest first (maintenance alerts)
+        db.Index('ix_messages_seen_timestamp', 'seen', 'timestamp'),
+        # the paged contact-messages list, newest first
+        db.Index('ix_messages_timestamp', 'timestamp', 'id'),
+    )
+
 class Users(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(150), unique=True, nullable=False)
@@ -106,6 +114,50 @@ class SemesterSchedule(db.Model):
     end_time = db.Column(db.Time, nullable=False)
     course_name = db.Column(db.String(100), nullable=True)
 
+    __table_args__ = (
+        # "classes in these rooms on this weekday" (conflict checks)
+        db.Index('ix_semester_schedule_room_day', 'room_id', 'day_of_week'),
+    )
+
+
+# --- SEMESTER CALENDAR (see semesters.py) ---
+
+class Semester(db.Model):
+    # The weekly timetable above only applies between these dates
+    __tablename__ = 'semester'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    start_date = db.Column(db.Date, nullable=False)
+    end_date = db.Column(db.Date, nullable=False)
+
+class Holiday(db.Model):
+    # No classes on these days (rooms are still bookable)
+    __tablename__ = 'holiday'
+    id = db.Column(db.Integer, primary_key=True)
+    holiday_date = db.Column(db.Date, unique=True, nullable=False)
+    name = db.Column(db.String(100), nullable=True)
+
+class ClassOccurrence(db.Model):
+    # One row per actual class meeting, generated from SemesterSchedule for every
+    # Semester minus Holidays. Never edited by hand - semesters.materialize() rebuilds it.
+    __tablename__ = 'class_occurrence'
+    id = db.Column(db.Integer, primary_key=True)
+    schedule_id = db.Column(db.Integer, db.ForeignKey('semester_schedule.id'), nullable=False)
+    semester_id = db.Column(db.Integer, db.ForeignKey('semester.id'), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms_list.id'), nullable=False)
+    occurrence_date = db.Column(db.Date, nullable=False)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    course_name = db.Column(db.String(100), nullable=True)
+
+    __table_args__ = (
+        # conflict checks / free-room search / grid: these rooms on these dates
+        db.Index('ix_class_occurrence_room_date', 'room_id', 'occurrence_date'),
+        # everything on one day (occupancy index)
+        db.Index('ix_class_occurrence_date', 'occurrence_date'),
+        db.Index('ix_class_occurrence_semester', 'semester_id'),
+    )
+
 class BookingsNew(db.Model):
     __tablename__ = 'bookings_new'
     id = db.Column(db.Integer, primary_key=True)
@@ -120,3 +172,108 @@ class BookingsNew(db.Model):
 
     # Relationship to User (Assuming your Users table is named 'users')
     user = db.relationship('Users', backref='new_bookings')
+
+    # Indexes for the hot paths (checked by check_query_plans.py)
+    __table_args__ = (
+        # conflict checks: one room, one date, blocking statuses
+        db.Index('ix_bookings_new_room_date_status', 'room_id', 'booking_date', 'status'),
+        # "My Bookings" pages, newest first
+        db.Index('ix_bookings_new_user_date', 'user_id', 'booking_date'),
+        # pending approvals (count + pages ordered by date); also serves status-only filters
+        db.Index('ix_bookings_new_status_date', 'status', 'booking_date'),
+        # everything on one day across all rooms (occupancy index, dashboard date filter)
+        db.Index('ix_bookings_new_date', 'booking_date'),
+    )
+
+
+class BookingArchive(db.Model):
+    # Past bookings moved out of bookings_new by the archival job (see archive.py).
+    # Same columns and ids as bookings_new. On PostgreSQL this is a table
+    # partitioned by booking_date, one partition per year.
+    __tablename__ = 'bookings_archive'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms_list.id'), nullable=False)
+    # part of the primary key because PostgreSQL wants the partition key in it
+    booking_date = db.Column(db.Date, primary_key=True)
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    status = db.Column(db.String(20))
+    reason = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime)
+
+    room = db.relationship('RoomsList')
+    user = db.relationship('Users')
+
+    __table_args__ = (
+        # "My Bookings" history pages (id too: it isn't the rowid here, and the pages sort by it)
+        db.Index('ix_bookings_archive_user_date', 'user_id', 'booking_date', 'id'),
+        # room feeds / exports for one room
+        db.Index('ix_bookings_archive_room_date', 'room_id', 'booking_date'),
+        {'postgresql_partition_by': 'RANGE (booking_date)'},
+    )
+
+
+class MessageClassification(db.Model):
+    # Filled in by the background classifier (maintenance.py), one row per message
+    __tablename__ = 'message_classification'
+    message_id = db.Column(db.Integer, db.ForeignKey('messages.id'), primary_key=True)
+    category = db.Column(db.String(50), nullable=False)
+    is_critical = db.Column(db.Boolean, nullable=False, default=False, index=True)
+    source = db.Column(db.String(20), nullable=False) # 'gemini' or 'local'
+    classified_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    message = db.relationship('Messages', backref=db.backref('classification', uselist=False))
+
+
+class BookingRollup(db.Model):
+    # Booking counts per day / start hour / room, kept up to date on every booking insert.
+    # The analytics read this instead of scanning bookings_new (see analytics.py).
+    __tablename__ = 'booking_rollup'
+    booking_date = db.Column(db.Date, primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms_list.id'), primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ForecastModel(db.Model):
+    # Fitted demand models, refreshed by the background trainer (see forecasting.py).
+    # name is 'daily_trend', 'peak_hour' or 'room:<id>'
+    __tablename__ = 'forecast_model'
+    name = db.Column(db.String(50), primary_key=True)
+    coef = db.Column(db.Float, nullable=False)
+    intercept = db.Column(db.Float, nullable=False)
+    prediction = db.Column(db.Float, nullable=False)
+    samples = db.Column(db.Integer, nullable=False)
+    trained_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    training_ms = db.Column(db.Float, nullable=False)
+
+
+# --- LEGACY MIGRATION (see legacy_migration.py) ---
+
+class MigrationCheckpoint(db.Model):
+    # How far each step of the legacy migration got; written in the same
+    # transaction as the batch it describes, so a restart never redoes or skips rows.
+    __tablename__ = 'migration_checkpoint'
+    step = db.Column(db.String(50), primary_key=True)  # 'rooms', 'bookings'
+    last_id = db.Column(db.Integer, nullable=False, default=0)
+    migrated = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+
+class JobLease(db.Model):
+    # Which process runs a background job (jobs.py). Every web worker starts the
+    # jobs, but only the one holding an unexpired lease actually does the work.
+    __tablename__ = 'job_lease'
+    name = db.Column(db.String(50), primary_key=True)
+    holder = db.Column(db.String(100), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+
+class LegacyRoomMap(db.Model):
+    # Old rooms.room_id -> the rooms_list row it became
+    __tablename__ = 'legacy_room_map'
+    legacy_room_id = db.Column(db.Integer, primary_key=True)
+    room_id = db.Column(db.Integer, db.ForeignKey('rooms_list.id'), nullable=False)
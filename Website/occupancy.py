@@ -0,0 +1,131 @@
+"""
+OCCUPANCY INDEX: In-memory map of busy intervals per (room, date).
+
+The booking page asks /api/get-availability again every time the user
+changes the room or the date, so answering from the database each time is
+wasteful. The index keeps:
+
+  * per date, for all rooms: the class meetings of that date (ClassOccurrence,
+    see semesters.py) and the non-rejected BookingsNew rows, loaded the first
+    time that date is asked for
+
+Each interval is stored pre-formatted and kept sorted, so a lookup is just a
+merge of two short sorted lists. Writes from book_room_new / handle_approval
+patch the index in place instead of throwing it away.
+
+The index lives in the worker process. Loaded dates expire after `ttl`
+seconds so writes made by other workers show up eventually.
+"""
+import threading
+import time as _time
+from bisect import insort
+from collections import OrderedDict
+
+from .models import ClassOccurrence, BookingsNew
+
+
+def _entry(start_time, end_time, key, reason):
+    # (sort key..., JSON-ready dict) - the dict is built once, when the row is loaded
+    return (start_time, key, end_time, {
+        'start': start_time.strftime("%H:%M"),
+        'end': end_time.strftime("%H:%M"),
+        'reason': reason
+    })
+
+
+class OccupancyIndex:
+    def __init__(self, ttl=600, max_dates=400):
+        self.ttl = ttl
+        self.max_dates = max_dates
+        self._lock = threading.RLock()
+        self._dates = OrderedDict()       # {date: (loaded_at, {room_id: [entry, ...]})}
+
+    # ---------------------------------------------------------
+    #  LOADING
+    # ---------------------------------------------------------
+
+    def _load_date(self, target_date):
+        classes = ClassOccurrence.query.with_entities(
+            ClassOccurrence.id, ClassOccurrence.room_id, ClassOccurrence.start_time,
+            ClassOccurrence.end_time, ClassOccurrence.course_name
+        ).filter(ClassOccurrence.occurrence_date == target_date).all()
+        bookings = BookingsNew.query.with_entities(
+            BookingsNew.id, BookingsNew.room_id, BookingsNew.start_time, BookingsNew.end_time
+        ).filter(
+            BookingsNew.booking_date == target_date,
+            BookingsNew.status != 'Rejected'
+        ).all()
+
+        rooms = {}
+        for occurrence_id, room_id, start, end, course in classes:
+            insort(rooms.setdefault(room_id, []), _entry(start, end, ('c', occurrence_id), f"Class: {course}"))
+        for booking_id, room_id, start, end in bookings:
+            insort(rooms.setdefault(room_id, []), _entry(start, end, ('b', booking_id), "Booked"))
+        return rooms
+
+    def _bookings_for_date(self, target_date, load=True):
+        """Returns {room_id: [entry, ...]} (classes + bookings) for the date, loading it if needed."""
+        with self._lock:
+            cached = self._dates.get(target_date)
+            if cached and _time.monotonic() - cached[0] < self.ttl:
+                self._dates.move_to_end(target_date)
+                return cached[1]
+            if not load:
+                return None
+
+            rooms = self._load_date(target_date)
+            self._dates[target_date] = (_time.monotonic(), rooms)
+            self._dates.move_to_end(target_date)
+            while len(self._dates) > self.max_dates:
+                self._dates.popitem(last=False)
+            return rooms
+
+    # ---------------------------------------------------------
+    #  LOOKUPS
+    # ---------------------------------------------------------
+
+    def blocked_slots(self, room_id, target_date):
+        """Sorted list of {'start', 'end', 'reason'} dicts for one room on one date."""
+        return [e[3] for e in self._bookings_for_date(target_date).get(int(room_id), [])]
+
+    def busy_intervals(self, target_date, room_ids=None):
+        """{room_id: [(start, end), ...]} sorted by start, for every room busy on the date."""
+        rooms = self._bookings_for_date(target_date)
+        if room_ids is None:
+            room_ids = list(rooms)
+        return {room_id: [(e[0], e[2]) for e in rooms[room_id]] for room_id in room_ids if rooms.get(room_id)}
+
+    # ---------------------------------------------------------
+    #  INCREMENTAL UPDATES (call after a successful commit)
+    # ---------------------------------------------------------
+
+    def record_booking(self, booking):
+        """Adds a new booking, or re-applies one whose status/time changed."""
+        # read the attributes before locking - after a commit they may need a refresh
+        key = ('b', booking.id)
+        room_id = int(booking.room_id)
+        entry = None
+        if booking.status != 'Rejected':
+            entry = _entry(booking.start_time, booking.end_time, key, "Booked")
+
+        with self._lock:
+            rooms = self._bookings_for_date(booking.booking_date, load=False)
+            if rooms is None:
+                return  # date not loaded yet - it will be read fresh when asked for
+
+            # lists are replaced, never mutated, so readers outside the lock stay safe
+            for r, entries in list(rooms.items()):
+                if any(e[1] == key for e in entries):
+                    rooms[r] = [e for e in entries if e[1] != key]
+            if entry:
+                rooms[room_id] = sorted(rooms.get(room_id, []) + [entry])
+
+    def invalidate(self, target_date=None):
+        with self._lock:
+            if target_date is None:
+                self._dates.clear()
+            else:
+                self._dates.pop(target_date, None)
+
+
+occupancy = OccupancyIndex()
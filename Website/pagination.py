@@ -0,0 +1,102 @@
+"""
+KEYSET PAGINATION: "Next page" by position instead of OFFSET.
+
+A page is asked for with an opaque cursor that holds the sort value and id of
+the last row the client saw, e.g. (booking_date, id) or (timestamp, id). The
+next page is simply "rows after that pair", which the database answers
+straight from the index - page 500 costs the same as page 1, no matter how
+much history has piled up. The id tie-breaker keeps rows with the same date
+from being skipped or shown twice.
+"""
+import base64
+import json
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(sort_value, row_id):
+    raw = json.dumps([sort_value.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse):
+    """
+    Turns a cursor back into (sort_value, id). `parse` rebuilds the sort
+    value (date.fromisoformat / datetime.fromisoformat).
+    Raises ValueError if the cursor is garbage.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return parse(sort_value), int(row_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def page_size(value, default=DEFAULT_PAGE_SIZE):
+    """Reads ?limit=..., clamped to 1..MAX_PAGE_SIZE."""
+    try:
+        return max(1, min(int(value), MAX_PAGE_SIZE))
+    except (TypeError, ValueError):
+        return default
+
+
+def _after_cursor(query, sort_col, id_col, cursor, limit, descending):
+    # One extra row tells us whether there is a next page without a COUNT(*)
+    parse = datetime.fromisoformat if sort_col.type.python_type is datetime else date.fromisoformat
+
+    if cursor:
+        last_value, last_id = decode_cursor(cursor, parse)
+        if descending:
+            after = or_(sort_col < last_value, and_(sort_col == last_value, id_col < last_id))
+        else:
+            after = or_(sort_col > last_value, and_(sort_col == last_value, id_col > last_id))
+        query = query.filter(after)
+
+    if descending:
+        query = query.order_by(sort_col.desc(), id_col.desc())
+    else:
+        query = query.order_by(sort_col, id_col)
+    return query.limit(limit + 1).all()
+
+
+def _cut(rows, sort_key, id_key, limit):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, sort_key), getattr(last, id_key))
+
+
+def keyset_page(query, sort_col, id_col, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    Returns (rows, next_cursor) for one page of `query` ordered by
+    (sort_col, id_col). next_cursor is None on the last page.
+
+    The "after the cursor" filter is written out as
+        sort > v OR (sort = v AND id > last_id)
+    rather than a row-value comparison, so it works the same on SQLite and
+    PostgreSQL and can use the composite index on both.
+    """
+    rows = _after_cursor(query, sort_col, id_col, cursor, limit, descending)
+    return _cut(rows, sort_col.key, id_col.key, limit)
+
+
+def keyset_page_many(sources, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    keyset_page over several tables as if they were one, e.g. bookings_new
+    + bookings_archive. `sources` is a list of (query, sort_col, id_col)
+    with the same key in every table and ids that don't repeat across them.
+    Each table gives its own next limit + 1 rows (index walk as usual) and
+    the page is the first ones of the merged list, so one cursor works for all.
+    """
+    rows = []
+    for query, sort_col, id_col in sources:
+        rows.extend(_after_cursor(query, sort_col, id_col, cursor, limit, descending))
+    sort_key, id_key = sources[0][1].key, sources[0][2].key
+    rows.sort(key=lambda r: (getattr(r, sort_key), getattr(r, id_key)), reverse=descending)
+    return _cut(rows, sort_key, id_key, limit)
@@ -0,0 +1,216 @@
+"""
+AI SCHEDULING ENGINE: Finds concrete free windows of a requested length.
+
+All busy intervals for the date come from the occupancy index (one bookings
+query for every room, classes cached), so scanning a few hundred rooms is
+pure Python over short sorted lists - no per-room queries.
+
+find_free_rooms answers the opposite question - "which rooms are free for
+this exact window?" - straight in SQL, as one query for the whole campus.
+
+availability_grid gives the week-view calendar everything it needs for many
+rooms and days at once: one classes query + one bookings query.
+"""
+import heapq
+from datetime import time
+
+from sqlalchemy import and_, exists
+
+from . import db
+from .models import RoomsList, ClassOccurrence, BookingsNew
+from .occupancy import occupancy
+from .booking import blocking_statuses, needs_approval
+
+# Bookable hours, same as the booking page ("08:00 - 00:00"), in minutes
+DAY_OPEN = 8 * 60
+DAY_CLOSE = 24 * 60
+# The latest end a booking can have: the form and book_room_new take no "24:00",
+# and an end of 00:00 isn't after the start
+LAST_END = DAY_CLOSE - 1
+# Slots ending after this need admin approval (the 6 PM rule)
+APPROVAL_AFTER = 18 * 60
+
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+
+def _clock(minutes):
+    return time(minutes // 60, minutes % 60).strftime("%H:%M")
+
+
+def free_gaps(intervals, open_min=DAY_OPEN, close_min=DAY_CLOSE):
+    """
+    Sweeps one room's busy intervals (sorted by start) and yields every
+    (gap_start, gap_end) in minutes between open_min and close_min.
+    Overlapping / touching intervals are merged on the way.
+    """
+    cursor = open_min
+    for start, end in intervals:
+        s, e = _minutes(start), _minutes(end)
+        if e <= s:          # ends at midnight (00:00) or bad data - treat as end of day
+            e = close_min
+        if s > cursor:
+            yield cursor, min(s, close_min)
+        cursor = max(cursor, e)
+        if cursor >= close_min:
+            return
+    if cursor < close_min:
+        yield cursor, close_min
+
+
+def find_free_windows(target_date, duration_minutes, limit=10):
+    """
+    Returns up to `limit` ranked windows across all active rooms:
+    [{'room_id', 'room_name', 'capacity', 'start', 'end', 'gap_end', 'needs_approval'}]
+
+    Ranking: slots that don't need admin approval first, then the tightest
+    fit (least wasted time left in the gap), then the earliest start.
+    """
+    rooms = RoomsList.query.with_entities(
+        RoomsList.id, RoomsList.name, RoomsList.capacity
+    ).filter_by(is_active=True).all()
+    busy = occupancy.busy_intervals(target_date, room_ids=[r.id for r in rooms])
+
+    candidates = []
+    for room in rooms:
+        # windows stop at 23:59 so every recommendation can actually be booked
+        for gap_start, gap_end in free_gaps(busy.get(room.id, []), close_min=LAST_END):
+            if gap_end - gap_start < duration_minutes:
+                continue
+            end = gap_start + duration_minutes
+            needs_approval = end > APPROVAL_AFTER
+            leftover = gap_end - gap_start - duration_minutes
+            candidates.append(((needs_approval, leftover, gap_start, room.id), {
+                'room_id': room.id,
+                'room_name': room.name,
+                'capacity': room.capacity,
+                'start': _clock(gap_start),
+                'end': _clock(end),
+                'gap_end': _clock(gap_end),
+                'needs_approval': needs_approval
+            }))
+
+    return [c[1] for c in heapq.nsmallest(limit, candidates, key=lambda c: c[0])]
+
+
+def find_free_rooms(target_date, start_time, end_time, min_capacity=None, location=None,
+                    amenities=(), limit=50):
+    """
+    Active rooms matching the filters with nothing blocking start_time-end_time
+    on target_date, in ONE query: the room filters plus two NOT EXISTS
+    anti-joins (class meetings and blocking bookings on that date), both
+    served by the (room_id, date) indexes.
+
+    Blocking follows book_room_new: classes and Confirmed bookings always
+    block; Pending requests only block daytime slots (evening requests
+    compete for the slot and the admin picks one).
+
+    Ranked by capacity fit - the smallest room that still seats everyone
+    first - then by name.
+    """
+    statuses = blocking_statuses(include_pending=not needs_approval(start_time, end_time))
+
+    booked = exists().where(and_(
+        BookingsNew.room_id == RoomsList.id,
+        BookingsNew.booking_date == target_date,
+        BookingsNew.status.in_(statuses),
+        BookingsNew.start_time < end_time,
+        BookingsNew.end_time > start_time
+    ))
+
+    in_class = exists().where(and_(
+        ClassOccurrence.room_id == RoomsList.id,
+        ClassOccurrence.occurrence_date == target_date,
+        ClassOccurrence.start_time < end_time,
+        ClassOccurrence.end_time > start_time
+    ))
+
+    query = db.session.query(
+        RoomsList.id, RoomsList.name, RoomsList.capacity, RoomsList.location, RoomsList.amenities
+    ).filter(RoomsList.is_active == True, ~booked, ~in_class)
+
+    if min_capacity:
+        query = query.filter(RoomsList.capacity >= min_capacity)
+    if location:
+        query = query.filter(RoomsList.location.ilike(f'%{location}%'))
+    for amenity in amenities:
+        query = query.filter(RoomsList.amenities.ilike(f'%{amenity}%'))
+
+    fit = RoomsList.capacity - (min_capacity or 0)
+    rows = query.order_by(fit, RoomsList.name, RoomsList.id).limit(limit).all()
+
+    return [{
+        'room_id': r.id,
+        'room_name': r.name,
+        'capacity': r.capacity,
+        'spare_seats': r.capacity - min_capacity if min_capacity else None,
+        'location': r.location,
+        'amenities': r.amenities
+    } for r in rows]
+
+
+def _busy_bits(intervals, slot_minutes):
+    """Bit i is set when anything overlaps the i-th slot after DAY_OPEN."""
+    bits = 0
+    slots = (DAY_CLOSE - DAY_OPEN) // slot_minutes
+    for start, end in intervals:
+        s, e = _minutes(start), _minutes(end)
+        if e <= s:
+            e = DAY_CLOSE
+        first = max(0, (s - DAY_OPEN) // slot_minutes)
+        last = min(slots, -(-(e - DAY_OPEN) // slot_minutes))  # ceil
+        for i in range(first, last):
+            bits |= 1 << i
+    return bits
+
+
+def availability_grid(room_ids, start_date, end_date, bitsets=False, slot_minutes=30):
+    """
+    Blocked intervals for every room x day in [start_date, end_date]:
+        {room_id: {'2025-10-06': [['09:00', '11:00', 'Class: CS101'], ...]}}
+    Days with nothing booked are left out. Same rules as /api/get-availability
+    (class meetings + non-rejected bookings).
+
+    With bitsets=True each day is instead a hex string of busy slots of
+    `slot_minutes` from DAY_OPEN, lowest bit = the first slot.
+    """
+    room_ids = sorted(set(room_ids))
+    per_slot = {room_id: {} for room_id in room_ids}  # room -> date -> [(start, end, reason)]
+
+    # Query 1: every non-rejected booking of these rooms in the range
+    bookings = db.session.query(
+        BookingsNew.room_id, BookingsNew.booking_date, BookingsNew.start_time, BookingsNew.end_time
+    ).filter(
+        BookingsNew.room_id.in_(room_ids),
+        BookingsNew.booking_date.between(start_date, end_date),
+        BookingsNew.status != 'Rejected'
+    )
+    for room_id, on_date, start, end in bookings:
+        per_slot[room_id].setdefault(on_date, []).append((start, end, "Booked"))
+
+    # Query 2: the class meetings of these rooms in the range
+    classes = db.session.query(
+        ClassOccurrence.room_id, ClassOccurrence.occurrence_date, ClassOccurrence.start_time,
+        ClassOccurrence.end_time, ClassOccurrence.course_name
+    ).filter(
+        ClassOccurrence.room_id.in_(room_ids),
+        ClassOccurrence.occurrence_date.between(start_date, end_date)
+    )
+    for room_id, on_date, start, end, course in classes:
+        per_slot[room_id].setdefault(on_date, []).append((start, end, f"Class: {course}"))
+
+    grid = {}
+    for room_id, by_date in per_slot.items():
+        grid[room_id] = {}
+        for d, intervals in sorted(by_date.items()):
+            intervals.sort(key=lambda i: (i[0], i[1]))
+            if bitsets:
+                grid[room_id][d.isoformat()] = format(_busy_bits(
+                    [(start, end) for start, end, _ in intervals], slot_minutes), 'x')
+            else:
+                grid[room_id][d.isoformat()] = [
+                    [start.strftime("%H:%M"), end.strftime("%H:%M"), reason] for start, end, reason in intervals
+                ]
+    return grid
+
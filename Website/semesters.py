@@ -0,0 +1,158 @@
+"""
+SEMESTER CALENDAR: Terms, holidays and the concrete class meetings.
+
+SemesterSchedule is the weekly timetable ("CS101, room 1, Mondays 9-11").
+materialize() turns it into one ClassOccurrence row per real class meeting
+(room, date, start, end) for every Semester, skipping Holidays. Everything
+that asks "is the room free?" (occupancy index, conflict checks, free-room
+search, the week grid) then runs a plain indexed date query; a date outside
+every semester simply has no class rows.
+
+Re-run materialize() after changing the timetable, the semesters or the
+holidays. The `flask semester ...` commands below do that for you.
+"""
+from datetime import date, datetime, timedelta
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import delete, insert
+
+from . import db
+from .models import Semester, Holiday, ClassOccurrence, SemesterSchedule
+
+# The semester that used to be hardcoded. init-db creates it when there is none yet,
+# so an existing database keeps behaving exactly as before.
+DEFAULT_SEMESTER = ('Fall 2025', date(2025, 9, 1), date(2025, 12, 31))
+CHUNK = 5000
+
+
+def materialize(semester_ids=None):
+    """
+    Rebuilds the class occurrences of the given semesters (default: all).
+    Returns how many rows were written. Commits.
+    """
+    query = Semester.query
+    if semester_ids is not None:
+        query = query.filter(Semester.id.in_(semester_ids))
+    semesters = query.all()
+    if not semesters:
+        return 0
+
+    timetable = {}  # weekday name -> [schedule rows]
+    for row in db.session.query(
+        SemesterSchedule.id, SemesterSchedule.room_id, SemesterSchedule.day_of_week,
+        SemesterSchedule.start_time, SemesterSchedule.end_time, SemesterSchedule.course_name
+    ):
+        timetable.setdefault(row.day_of_week, []).append(row)
+
+    first = min(s.start_date for s in semesters)
+    last = max(s.end_date for s in semesters)
+    holidays = {d for (d,) in db.session.query(Holiday.holiday_date)
+                .filter(Holiday.holiday_date.between(first, last))}
+
+    db.session.execute(delete(ClassOccurrence).where(
+        ClassOccurrence.semester_id.in_([s.id for s in semesters])))
+
+    written = 0
+    batch = []
+    for semester in semesters:
+        day = semester.start_date
+        while day <= semester.end_date:
+            if day not in holidays:
+                for cls in timetable.get(day.strftime("%A"), []):
+                    batch.append({
+                        'schedule_id': cls.id, 'semester_id': semester.id, 'room_id': cls.room_id,
+                        'occurrence_date': day, 'start_time': cls.start_time, 'end_time': cls.end_time,
+                        'course_name': cls.course_name
+                    })
+            if len(batch) >= CHUNK:
+                db.session.execute(insert(ClassOccurrence), batch)
+                written += len(batch)
+                batch = []
+            day += timedelta(days=1)
+    if batch:
+        db.session.execute(insert(ClassOccurrence), batch)
+        written += len(batch)
+    db.session.commit()
+
+    # the occupancy index caches class slots per date
+    from .occupancy import occupancy
+    occupancy.invalidate()
+    return written
+
+
+def ensure_semester():
+    if Semester.query.first() is None:
+        name, start, end = DEFAULT_SEMESTER
+        db.session.add(Semester(name=name, start_date=start, end_date=end))
+        db.session.commit()
+
+
+def ensure_calendar():
+    """
+    init-db: make sure there is a semester and that the timetable has been
+    materialized. Commits, so request code never calls it - pages only read
+    the calendar.
+    """
+    ensure_semester()
+    if db.session.query(ClassOccurrence.id).first() is None and \
+            db.session.query(SemesterSchedule.id).first() is not None:
+        materialize()
+
+
+def semesters_covering(start, end):
+    return Semester.query.filter(Semester.start_date <= end, Semester.end_date >= start).all()
+
+
+# =========================================================
+#  CLI:  flask --app main semester ...
+# =========================================================
+
+semester_cli = AppGroup('semester', help="Semesters, holidays and the class calendar.")
+
+
+def _parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+@semester_cli.command('list')
+def list_semesters():
+    for s in Semester.query.order_by(Semester.start_date):
+        count = ClassOccurrence.query.filter_by(semester_id=s.id).count()
+        print(f"{s.id:3}  {s.name:20} {s.start_date} .. {s.end_date}   {count} class meetings")
+    for h in Holiday.query.order_by(Holiday.holiday_date):
+        print(f"     holiday {h.holiday_date}  {h.name or ''}")
+
+
+@semester_cli.command('add')
+@click.argument('name')
+@click.argument('start')
+@click.argument('end')
+def add_semester(name, start, end):
+    """Adds a semester, e.g.: flask semester add "Spring 2026" 2026-01-12 2026-05-08"""
+    semester = Semester(name=name, start_date=_parse_date(start), end_date=_parse_date(end))
+    if semester.end_date < semester.start_date:
+        raise click.BadParameter("end must be on or after start")
+    db.session.add(semester)
+    db.session.commit()
+    print(f"Added {name}: {materialize([semester.id])} class meetings")
+
+
+@semester_cli.command('holiday')
+@click.argument('day')
+@click.argument('name', required=False)
+def add_holiday(day, name):
+    """Cancels all classes on a date, e.g.: flask semester holiday 2025-11-27 Thanksgiving"""
+    holiday_date = _parse_date(day)
+    db.session.add(Holiday(holiday_date=holiday_date, name=name))
+    db.session.commit()
+    affected = [s.id for s in semesters_covering(holiday_date, holiday_date)]
+    if affected:
+        materialize(affected)
+    print(f"Holiday {holiday_date} added")
+
+
+@semester_cli.command('materialize')
+def materialize_command():
+    """Rebuilds every class meeting from the weekly timetable."""
+    print(f"{materialize()} class meetings written")
@@ -0,0 +1,100 @@
+// =========================================================
+//  STREAMING CHAT CLIENT (Server-Sent Events over fetch)
+// =========================================================
+//
+// EventSource only does GET, and the chatbot needs a POST body, so we read the
+// text/event-stream response by hand.
+//
+//   const chat = streamChatbotReply(url, message, {
+//     onToken: (token, fullText) => { ... },
+//     onDone:  (fullText) => { ... },
+//     onError: (message) => { ... },
+//     timeoutMs: 45000,
+//   });
+//   chat.cancel();   // stops reading and closes the connection
+//
+// Cancelling (or leaving the page) aborts the request, which closes the
+// connection so the server stops generating as well.
+
+function streamChatbotReply(url, message, handlers) {
+  const { onToken = () => {}, onDone = () => {}, onError = () => {}, timeoutMs = 45000 } = handlers || {};
+  const controller = new AbortController();
+  let fullText = "";
+  let finished = false;
+
+  const finish = (callback, arg) => {
+    if (finished) return;
+    finished = true;
+    clearTimeout(timer);
+    window.removeEventListener("beforeunload", cancel);
+    callback(arg);
+  };
+
+  const cancel = () => controller.abort();
+  const timer = setTimeout(() => {
+    controller.abort();
+    finish(onError, "The assistant took too long to answer. Please try again.");
+  }, timeoutMs);
+  window.addEventListener("beforeunload", cancel);
+
+  // Handles one "event: ...\ndata: ..." block
+  const handleEvent = (block) => {
+    let eventName = "message";
+    let data = "";
+    block.split("\n").forEach((line) => {
+      if (line.startsWith("event:")) eventName = line.slice(6).trim();
+      else if (line.startsWith("data:")) data += line.slice(5).trim();
+    });
+    if (!data) return;
+
+    const payload = JSON.parse(data);
+    if (eventName === "error") {
+      finish(onError, payload.error || "Something went wrong.");
+    } else if (eventName === "done") {
+      finish(onDone, fullText);
+    } else if (payload.token) {
+      fullText += payload.token;
+      onToken(payload.token, fullText);
+    }
+  };
+
+  (async () => {
+    try {
+      const response = await fetch(url, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", Accept: "text/event-stream" },
+        body: JSON.stringify({ message: message }),
+        signal: controller.signal,
+      });
+      if (!response.ok || !response.body) {
+        throw new Error(`Server Error: ${response.status}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+          handleEvent(buffer.slice(0, boundary));
+          buffer = buffer.slice(boundary + 2);
+        }
+      }
+      if (!finished) finish(onDone, fullText); // stream closed without a "done" event
+      reader.cancel().catch(() => {});
+    } catch (error) {
+      if (error.name !== "AbortError") {
+        console.error("Error:", error);
+        finish(onError, "System Error: Unable to reach the AI server.");
+      }
+    }
+  })();
+
+  return { cancel: cancel };
+}
@@ -0,0 +1,415 @@
+"""
+TIMETABLE IMPORT: Loads the registrar's timetable export (CSV or ICS).
+
+The file is read line by line and written in batches, so a huge export
+never sits in memory. For every line we:
+  1. validate it (known weekday, real times, end after start, ...)
+  2. find its room by name - or create it / update capacity, location and
+     amenities when the file has them
+  3. queue a SemesterSchedule row; full batches go out with COPY on
+     PostgreSQL and one executemany INSERT everywhere else
+Bad lines are skipped and reported with their line number, the rest still
+loads. Lines already in the timetable (same room, day, times and course)
+are skipped too, so importing the same file twice is harmless.
+
+CSV needs a header row:
+    room,day,start,end,course[,capacity,location,amenities]
+    C-101,Monday,09:00,11:00,CS101,40,Block A,"Projector, Wifi"
+
+ICS: one VEVENT per weekly class. LOCATION is the room, SUMMARY the course,
+DTSTART/DTEND the times and RRULE BYDAY the weekdays (default: the weekday
+of DTSTART). Times are taken as written, no timezone conversion. Exports
+that list every meeting as its own event work too - repeats of the same
+weekly slot are skipped as duplicates.
+
+Afterwards the class calendar is rebuilt (semesters.materialize()).
+
+    flask --app main semester import timetable.csv [--replace]
+or the "Import Timetable" form on the Manage Rooms page.
+"""
+import codecs
+import csv
+import io
+import time as _time
+from datetime import datetime, time
+from functools import lru_cache
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, insert, update
+
+from . import db, cache, semesters
+from .models import RoomsList, SemesterSchedule, ClassOccurrence
+
+BATCH_SIZE = 5000
+MAX_REJECTS_KEPT = 100  # only the first ones are listed, the rest are just counted
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+_DAY_NAMES = {**{d.lower(): d for d in DAYS}, **{d[:3].lower(): d for d in DAYS}}
+_ICS_DAYS = {'MO': 'Monday', 'TU': 'Tuesday', 'WE': 'Wednesday', 'TH': 'Thursday',
+             'FR': 'Friday', 'SA': 'Saturday', 'SU': 'Sunday'}
+
+# CSV header names we understand -> field
+_COLUMNS = {
+    'room': 'room', 'room_name': 'room',
+    'day': 'day', 'day_of_week': 'day', 'weekday': 'day',
+    'start': 'start', 'start_time': 'start',
+    'end': 'end', 'end_time': 'end',
+    'course': 'course', 'course_name': 'course',
+    'capacity': 'capacity', 'location': 'location', 'amenities': 'amenities',
+}
+_REQUIRED = ('room', 'day', 'start', 'end')
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0           # timetable entries written
+        self.duplicates = 0     # already in the timetable / repeated in the file
+        self.rejected = []      # (line number, reason, line) - the first MAX_REJECTS_KEPT
+        self.rejected_count = 0
+        self.rooms_created = 0
+        self.rooms_updated = 0
+        self.seconds = 0.0
+        self.meetings = 0       # class meetings after materializing
+        self.materialize_seconds = 0.0
+
+    def reject(self, line_no, reason, line):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REJECTS_KEPT:
+            self.rejected.append((line_no, reason, line[:200]))
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (f"{self.rows} timetable entries loaded in {self.seconds:.2f}s "
+                f"({self.rows_per_second:,.0f} rows/s), {self.duplicates} duplicates skipped, "
+                f"{self.rejected_count} lines rejected, {self.rooms_created} rooms created, "
+                f"{self.rooms_updated} rooms updated, {self.meetings} class meetings "
+                f"materialized in {self.materialize_seconds:.2f}s")
+
+    def to_dict(self):
+        return {
+            'rows': self.rows,
+            'rows_per_second': round(self.rows_per_second, 1),
+            'seconds': round(self.seconds, 3),
+            'duplicates': self.duplicates,
+            'rejected_count': self.rejected_count,
+            'rejected': [{'line': n, 'reason': reason, 'text': text} for n, reason, text in self.rejected],
+            'rooms_created': self.rooms_created,
+            'rooms_updated': self.rooms_updated,
+            'class_meetings': self.meetings,
+        }
+
+
+def detect_format(filename):
+    return 'ics' if (filename or '').lower().endswith(('.ics', '.ical', '.ifb')) else 'csv'
+
+
+def text_lines(binary_stream):
+    """Decodes a binary file/upload lazily, one line at a time."""
+    return codecs.iterdecode(binary_stream, 'utf-8-sig')
+
+
+# ---------------------------------------------------------
+#  PARSERS: yield (line number, original line, raw fields)
+# ---------------------------------------------------------
+
+def parse_csv(lines):
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if header is None:
+        return
+    fields = [_COLUMNS.get(name.strip().lower()) for name in header]
+    missing = [name for name in _REQUIRED if name not in fields]
+    if missing:
+        raise ValueError(f"CSV header is missing: {', '.join(missing)}")
+
+    for values in reader:
+        if not any(v.strip() for v in values):
+            continue
+        record = {field: value.strip() for field, value in zip(fields, values) if field}
+        if len(values) > len(fields):
+            record['error'] = f"{len(values)} columns, header has {len(fields)}"
+        yield reader.line_num, ','.join(values), record
+
+
+def _ics_unescape(value):
+    return (value.replace('\\n', ' ').replace('\\N', ' ')
+            .replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\'))
+
+
+def _ics_unfold(lines):
+    """RFC 5545 long lines continue on lines starting with a space or tab."""
+    pending, pending_no = None, 0
+    for line_no, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending_no, pending
+        pending, pending_no = line, line_no
+    if pending is not None:
+        yield pending_no, pending
+
+
+def _ics_time(value):
+    # 20250901T090000 / 20250901T090000Z -> (date, "09:00:00")
+    value = value.rstrip('Z')
+    if 'T' not in value:
+        raise ValueError("all-day event, no class times")
+    moment = datetime.strptime(value[:15], "%Y%m%dT%H%M%S")
+    return moment.date(), moment.strftime("%H:%M:%S")
+
+
+def _ics_records(props):
+    """One VEVENT -> one raw record per weekday it meets on."""
+    if 'DTSTART' not in props or 'DTEND' not in props:
+        return [{'error': "event needs DTSTART and DTEND"}]
+    try:
+        first_day, start = _ics_time(props['DTSTART'])
+        end_day, end = _ics_time(props['DTEND'])
+    except ValueError as e:
+        return [{'error': f"bad DTSTART/DTEND: {e}"}]
+    if end_day != first_day:
+        return [{'error': "event runs past midnight"}]
+
+    days = [DAYS[first_day.weekday()]]
+    rule = dict(part.split('=', 1) for part in props.get('RRULE', '').split(';') if '=' in part)
+    if rule:
+        if rule.get('FREQ') != 'WEEKLY':
+            return [{'error': f"only weekly classes can be imported (RRULE FREQ={rule.get('FREQ')})"}]
+        if rule.get('BYDAY'):
+            # BYDAY can carry positions ("1MO") on monthly rules - weekly ones don't
+            days = [_ICS_DAYS.get(code[-2:], code) for code in rule['BYDAY'].split(',')]
+
+    base = {'room': props.get('LOCATION', ''), 'course': props.get('SUMMARY', ''),
+            'start': start, 'end': end}
+    return [{**base, 'day': day} for day in days]
+
+
+def parse_ics(lines):
+    props, event_line = None, 0
+    for line_no, line in _ics_unfold(lines):
+        if line == 'BEGIN:VEVENT':
+            props, event_line = {}, line_no
+        elif line == 'END:VEVENT' and props is not None:
+            summary = f"{props.get('SUMMARY', '?')} @ {props.get('LOCATION', '?')} {props.get('DTSTART', '')}"
+            for record in _ics_records(props):
+                yield event_line, summary, record
+            props = None
+        elif props is not None and ':' in line:
+            head, value = line.split(':', 1)
+            name = head.split(';', 1)[0].upper()  # drop parameters like ;TZID=...
+            props[name] = _ics_unescape(value.strip())
+
+
+PARSERS = {'csv': parse_csv, 'ics': parse_ics}
+
+
+# ---------------------------------------------------------
+#  VALIDATION + ROOMS
+# ---------------------------------------------------------
+
+@lru_cache(maxsize=1024)
+def _parse_time(value):
+    # a timetable only uses a handful of distinct times, so this is mostly cache hits
+    try:
+        return time.fromisoformat(value if len(value) != 4 else '0' + value)  # 9:00 -> 09:00
+    except ValueError:
+        raise ValueError(f"bad time {value!r} (use HH:MM)") from None
+
+
+def clean(record):
+    """Raw string fields -> a timetable row. Raises ValueError with the reason."""
+    if 'error' in record:
+        raise ValueError(record['error'])
+    for field in _REQUIRED:
+        if not record.get(field):
+            raise ValueError(f"missing {field}")
+
+    room = record['room']
+    if len(room) > 50:
+        raise ValueError("room name longer than 50 characters")
+    day = _DAY_NAMES.get(record['day'].lower())
+    if day is None:
+        raise ValueError(f"unknown day {record['day']!r}")
+    start, end = _parse_time(record['start']), _parse_time(record['end'])
+    if end <= start:
+        raise ValueError("end time must be after the start time")
+    course = record.get('course') or None
+    if course and len(course) > 100:
+        raise ValueError("course name longer than 100 characters")
+
+    capacity = record.get('capacity') or None
+    if capacity is not None:
+        if not capacity.isdigit() or int(capacity) == 0:
+            raise ValueError(f"bad capacity {capacity!r}")
+        capacity = int(capacity)
+    location = record.get('location') or None
+    if location and len(location) > 100:
+        raise ValueError("location longer than 100 characters")
+
+    return {'room': room, 'day': day, 'start': start, 'end': end, 'course': course,
+            'capacity': capacity, 'location': location, 'amenities': record.get('amenities') or None}
+
+
+class RoomDirectory:
+    """
+    Room name -> id, loaded once (rooms are a few thousand rows at most).
+    Creates rooms the file mentions that don't exist yet and updates the
+    details the file gives for existing ones.
+    """
+
+    def __init__(self, report):
+        self.report = report
+        self.rooms = {}
+        # active rooms win over deactivated ones with the same name, then the oldest
+        query = db.session.query(RoomsList.id, RoomsList.name, RoomsList.capacity,
+                                 RoomsList.location, RoomsList.amenities)
+        for row in query.order_by(RoomsList.is_active.desc(), RoomsList.id):
+            self.rooms.setdefault(row.name, {'id': row.id, 'capacity': row.capacity,
+                                             'location': row.location, 'amenities': row.amenities})
+
+    def resolve(self, row):
+        details = {k: row[k] for k in ('capacity', 'location', 'amenities') if row[k] is not None}
+        room = self.rooms.get(row['room'])
+        if room is None:
+            result = db.session.execute(insert(RoomsList).values(name=row['room'], is_active=True, **details))
+            room = self.rooms[row['room']] = {'id': result.inserted_primary_key[0], 'capacity': None,
+                                              'location': None, 'amenities': None, **details}
+            self.report.rooms_created += 1
+            return room['id']
+
+        changes = {k: v for k, v in details.items() if room[k] != v}
+        if changes:
+            db.session.execute(update(RoomsList).where(RoomsList.id == room['id']).values(**changes))
+            room.update(changes)
+            self.report.rooms_updated += 1
+        return room['id']
+
+
+# ---------------------------------------------------------
+#  BULK WRITERS
+# ---------------------------------------------------------
+
+_COPY_SQL = ("COPY semester_schedule (room_id, day_of_week, start_time, end_time, course_name) "
+             "FROM STDIN WITH (FORMAT csv)")
+
+
+def _copy_batch(batch):
+    # same connection + transaction as the session, so new rooms are visible
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in batch:
+        writer.writerow((row['room_id'], row['day_of_week'], row['start_time'].isoformat(),
+                         row['end_time'].isoformat(), row['course_name']))  # None -> empty -> NULL
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    try:
+        cursor.copy_expert(_COPY_SQL, buffer)
+    finally:
+        cursor.close()
+
+
+def _executemany_batch(batch):
+    db.session.execute(insert(SemesterSchedule), batch)
+
+
+def batch_writer():
+    engine = db.session.get_bind()
+    if engine.dialect.name == 'postgresql' and engine.dialect.driver == 'psycopg2':
+        return _copy_batch
+    return _executemany_batch
+
+
+# ---------------------------------------------------------
+#  THE IMPORT
+# ---------------------------------------------------------
+
+def import_timetable(lines, fmt='csv', replace=False, batch_size=BATCH_SIZE):
+    """
+    Loads a timetable from an iterable of text lines (see text_lines()).
+    replace=True clears the existing timetable first. Everything is one
+    transaction: an error halfway (not a bad line - those are just skipped)
+    leaves the old timetable untouched. Returns an ImportReport.
+    """
+    report = ImportReport()
+    started = _time.perf_counter()
+    write = batch_writer()
+    try:
+        if replace:
+            db.session.execute(delete(ClassOccurrence))
+            db.session.execute(delete(SemesterSchedule))
+            existing = set()
+        else:
+            # one small tuple per weekly slot - bounded by the timetable, not the file
+            existing = {tuple(row) for row in db.session.query(
+                SemesterSchedule.room_id, SemesterSchedule.day_of_week, SemesterSchedule.start_time,
+                SemesterSchedule.end_time, SemesterSchedule.course_name
+            )}
+        rooms = RoomDirectory(report)
+
+        batch = []
+        for line_no, line, record in PARSERS[fmt](lines):
+            try:
+                row = clean(record)
+            except ValueError as e:
+                report.reject(line_no, str(e), line)
+                continue
+
+            room_id = rooms.resolve(row)
+            key = (room_id, row['day'], row['start'], row['end'], row['course'])
+            if key in existing:
+                report.duplicates += 1
+                continue
+            existing.add(key)
+            batch.append({'room_id': room_id, 'day_of_week': row['day'], 'start_time': row['start'],
+                          'end_time': row['end'], 'course_name': row['course']})
+            if len(batch) >= batch_size:
+                write(batch)
+                report.rows += len(batch)
+                batch = []
+        if batch:
+            write(batch)
+            report.rows += len(batch)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    report.seconds = _time.perf_counter() - started
+    cache.bump('rooms')
+
+    # new/removed classes -> rebuild the class meetings of every semester
+    started = _time.perf_counter()
+    semesters.ensure_semester()
+    report.meetings = semesters.materialize()
+    report.materialize_seconds = _time.perf_counter() - started
+    return report
+
+
+# ---------------------------------------------------------
+#  CLI:  flask --app main semester import FILE
+# ---------------------------------------------------------
+
+@click.command('import')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ics']),
+              help="Default: from the file extension.")
+@click.option('--replace', is_flag=True, help="Delete the current timetable first.")
+@click.option('--batch-size', default=BATCH_SIZE, show_default=True)
+@with_appcontext
+def import_command(path, fmt, replace, batch_size):
+    """Imports the registrar's timetable export (CSV or ICS)."""
+    with open(path, 'rb') as f:
+        try:
+            report = import_timetable(text_lines(f), fmt or detect_format(path), replace, batch_size)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise click.ClickException(str(e))
+    print(report.summary())
+    for line_no, reason, line in report.rejected:
+        print(f"  line {line_no}: {reason}    {line}")
+    if report.rejected_count > len(report.rejected):
+        print(f"  ... and {report.rejected_count - len(report.rejected)} more")
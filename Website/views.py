@@ -1,27 +1,33 @@
-from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify
+from flask import Blueprint, render_template, flash, redirect, url_for, request, jsonify, Response, current_app, stream_with_context
 from flask_login import login_required, current_user
-from sqlalchemy import func, or_
+from sqlalchemy import func, or_, and_
 from datetime import datetime, timedelta, time, date
 import random 
 import os
-import google.generativeai as genai
-from dotenv import load_dotenv
-import numpy as np
-import pandas as pd
-from sklearn.linear_model import LinearRegression
+import math
 import json
+import hmac
+from contextlib import closing
 from . import db
-# Import Old models if needed for archiving, but we focus on NEW models
+# Old models: their data is moved over by `flask --app main migrate-legacy` (legacy_migration.py)
 from .models import Messages, Users, Admin_approvals 
 # Import NEW models
-from .models import RoomsList, SemesterSchedule, BookingsNew
+from .models import RoomsList, SemesterSchedule, BookingsNew, BookingArchive
+from .occupancy import occupancy
+from .scheduling import find_free_windows, find_free_rooms, availability_grid, DAY_OPEN, DAY_CLOSE
+from .booking import BookingConflict, InvalidRequest, check_slot, needs_approval, expand_recurrence, create_bulk, apply_approvals
+from . import cache, llm, jobs, maintenance, analytics, forecasting, metrics, timetable_import, exports
+from .cache import VersionedValue, VersionedCache
+from .database import read_only
+from .pagination import keyset_page, keyset_page_many, page_size
+from sqlalchemy.orm import joinedload
 
 views = Blueprint('views', __name__)
-load_dotenv()
 
-# Configure Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-model = genai.GenerativeModel('models/gemini-2.5-flash-lite')
+# Gemini is configured on first use and every call goes through the cached,
+# coalescing layer in llm.py
+CHATBOT_FALLBACK_REPLY = "My brain is buffering right now 😵‍💫. Try again in a sec!"
+CHATBOT_STREAM_TIMEOUT = 30  # seconds
 
 # =========================================================
 #  AI FEATURE HELPERS
@@ -29,265 +35,220 @@ model = genai.GenerativeModel('models/gemini-2.5-flash-lite')
 
 def analyze_messages_for_alerts():
     """
-    AI MAINTENANCE: Uses LLM to categorize messages and detect critical issues.
+    AI MAINTENANCE: Reads the critical issues found by the background
+    classifier (maintenance.py). Nothing is sent to Gemini on page view.
     """
-    messages = Messages.query.filter_by(seen=False).all()
-    if not messages:
-        return []
-
-    # Prepare messages for LLM analysis
-    batch_text = "\n".join([f"ID: {m.id} | Content: {m.content}" for m in messages])
-    
-    prompt = f"""
-    Analyze the following student messages. Identify which ones are reporting broken equipment, 
-    safety hazards, or facility issues. Return a JSON list of IDs that are 'critical'.
-    Messages:
-    {batch_text}
-    """
-    
-    alerts = []
-    try:
-        response = model.generate_content(prompt)
-        # Assuming the LLM returns a list of IDs or keywords
-        # For simplicity, we keep your keyword logic as a fallback
-        keywords = ['broken', 'wifi', 'projector', 'leak', 'faulty', 'not working', 'damage', 'ac']
-        
-        for msg in messages:
-            if any(word in msg.content.lower() for word in keywords):
-                alerts.append({
-                    'is_critical': True,
-                    'content': msg.content,
-                    'sender_name': msg.name,
-                    'id': msg.id,
-                    'category': "Facility Issue" # You could get this from Gemini too
-                })
-    except Exception as e:
-        print(f"AI Maintenance Error: {e}")
-        
-    return alerts
+    # pick up anything that arrived since the job last ran
+    jobs.nudge(maintenance.JOB_NAME)
+    return maintenance.critical_alerts()
 
 def get_peak_hour_prediction():
     """
-    ML: Predicts the busiest hour of the day based on historical BookingsNew data.
+    ML: Busiest hour of the day, from the model the background trainer fitted
+    on the hourly booking rollup (see forecasting.py).
     """
-    all_bookings = BookingsNew.query.all()
-    if len(all_bookings) < 10:
+    peak = forecasting.get_models('peak_hour').get('peak_hour')
+    if peak is None:
         return "Insufficient data for hourly trends."
-
-    df = pd.DataFrame([{
-        'hour': b.start_time.hour,
-        'day': b.booking_date.weekday()
-    } for b in all_bookings])
-
-    # Count bookings per hour
-    hourly_counts = df.groupby('hour').size().reset_index(name='count')
-    
-    X = hourly_counts[['hour']]
-    y = hourly_counts['count']
-    
-    model_lr = LinearRegression()
-    model_lr.fit(X, y)
-    
-    # Predict for hours 8 AM to 8 PM
-    hours_to_predict = np.array(range(8, 21)).reshape(-1, 1)
-    predictions = model_lr.predict(hours_to_predict)
-    peak_hour = hours_to_predict[np.argmax(predictions)][0]
-    
-    return f"Peak demand usually hits around {peak_hour}:00. Try booking early morning slots for better luck!"
+    return f"Peak demand usually hits around {int(peak.prediction)}:00. Try booking early morning slots for better luck!"
 
 def get_availability_insights():
     """
-    AI INSIGHTS: Predictions based on BookingsNew table.
+    AI INSIGHTS: Reads the stored forecasts (see forecasting.py) and the booking rollup.
+    Nothing is trained here - the models are refreshed in the background.
     """
-    # 1. Get Top 3 Popular Rooms
-    top_rooms_query = (
-        db.session.query(RoomsList.name, func.count(BookingsNew.id).label('booking_count'))
-        .join(BookingsNew, RoomsList.id == BookingsNew.room_id)
-        .group_by(RoomsList.name)
-        .order_by(func.count(BookingsNew.id).desc())
-        .limit(3)
-        .all()
-    )
-    top_rooms = [{'room_name': r[0], 'booking_count': r[1]} for r in top_rooms_query]
+    # 1. Get Top 3 Popular Rooms (+ their own forecast, if trained)
+    top_rooms_query = analytics.top_rooms(3)
+    models = forecasting.get_models('daily_trend', *[f'room:{r.room_id}' for r in top_rooms_query])
+    top_rooms = []
+    for room_id, name, count in top_rooms_query:
+        room_model = models.get(f'room:{room_id}')
+        top_rooms.append({
+            'room_name': name,
+            'booking_count': count,
+            'forecast': round(room_model.prediction, 1) if room_model else None
+        })
     
     # 2. Count Pending Approvals
     pending_count = BookingsNew.query.filter_by(status='Pending').count()
 
-    # 3. LINEAR REGRESSION FORECAST
-    all_bookings = db.session.query(BookingsNew.booking_date).all()
-    
-    if len(all_bookings) < 5:
+    # 3. LINEAR REGRESSION FORECAST (fitted by the background trainer)
+    trend_model = models.get('daily_trend')
+    model_status = forecasting.status()
+    if model_status is None:
+        # never trained in this database yet - ask the trainer to run now
+        jobs.nudge(forecasting.JOB_NAME)
+
+    if trend_model is None:
         forecast_msg = "Not enough data yet to predict trends. System needs at least 5 bookings."
     else:
-        try:
-            dates = [b[0] for b in all_bookings]
-            df = pd.DataFrame({'date': dates})
-            df['date'] = pd.to_datetime(df['date'])
-            daily_counts = df.groupby('date').size().reset_index(name='count')
-            daily_counts['date_ordinal'] = daily_counts['date'].map(datetime.toordinal)
-            
-            X = daily_counts[['date_ordinal']]
-            y = daily_counts['count']
-            
-            reg_model = LinearRegression()
-            reg_model.fit(X, y)
-            
-            # Predict Next Week
-            next_week_date = datetime.utcnow().date() + timedelta(days=7)
-            next_week_ordinal = np.array([[next_week_date.toordinal()]])
-            prediction = reg_model.predict(next_week_ordinal)[0]
-            
-            slope = reg_model.coef_[0]
-            
-            if slope > 0.1:
-                trend = "RISING SHARPLY"
-                advice = "High traffic expected. Book 3 days in advance."
-            elif slope > 0:
-                trend = "increasing slightly"
-                advice = "Standard availability."
-            elif slope < -0.1:
-                trend = "DECREASING"
-                advice = "Good availability expected."
-            else:
-                trend = "stable"
-                advice = "Demand is consistent."
-                
-            forecast_msg = (f"Market Trend: Demand is {trend}. "
-                            f"Projected usage: ~{int(prediction)} bookings/day next week. {advice}")
+        slope = trend_model.coef
+        prediction = trend_model.prediction
+
+        if slope > 0.1:
+            trend = "RISING SHARPLY"
+            advice = "High traffic expected. Book 3 days in advance."
+        elif slope > 0:
+            trend = "increasing slightly"
+            advice = "Standard availability."
+        elif slope < -0.1:
+            trend = "DECREASING"
+            advice = "Good availability expected."
+        else:
+            trend = "stable"
+            advice = "Demand is consistent."
             
-        except Exception as e:
-            print(f"ML Error: {e}")
-            forecast_msg = "Could not generate forecast model due to data inconsistency."
+        forecast_msg = (f"Market Trend: Demand is {trend}. "
+                        f"Projected usage: ~{int(prediction)} bookings/day next week. {advice}")
 
     return {
         'forecast': forecast_msg,
         'top_rooms': top_rooms,
-        'pending_approvals': pending_count
+        'pending_approvals': pending_count,
+        'model_status': model_status
     }
 
 def get_smart_schedule_recommendation(form_data):
     """
-    AI SCHEDULING: Logic to find time gaps in the new system.
+    AI SCHEDULING: Finds concrete free windows of the requested duration
+    across all active rooms (see scheduling.py) and recommends the best one.
     """
     req_date_str = form_data.get('preferred_date')
-    # If no preferred_time provided, we search the whole day, otherwise logic differs
-    # For this implementation, let's assume we search for a specific duration gap
-    duration_hours = 1.5 # Default duration if not specified
-    
+
     try:
         req_date = datetime.strptime(req_date_str, "%Y-%m-%d").date()
         day_name = req_date.strftime("%A")
-    except:
+    except (TypeError, ValueError):
         return None
 
-    candidate_rooms = RoomsList.query.filter_by(is_active=True).all()
-    
-    for room in candidate_rooms:
-        # Collect busy intervals
-        busy_intervals = []
-        
-        # Classes
-        classes = SemesterSchedule.query.filter_by(room_id=room.id, day_of_week=day_name).all()
-        for cls in classes:
-            busy_intervals.append((cls.start_time, cls.end_time))
-            
-        # Bookings
-        bookings = BookingsNew.query.filter_by(room_id=room.id, booking_date=req_date)\
-            .filter(BookingsNew.status != 'Rejected').all()
-        for b in bookings:
-            busy_intervals.append((b.start_time, b.end_time))
-            
-        busy_intervals.sort(key=lambda x: x[0])
-        
-        # Simple Logic: Check if there is space between 08:00 and the first event, 
-        # or between events. 
-        # For simplicity in this helper, we return the first room that is somewhat free.
-        
-        if len(busy_intervals) < 5: # Arbitrary "not too busy" check
-             return {
-                'room_name': room.name,
-                'capacity': room.capacity,
-                'reason': f"Room {room.name} has a light schedule on {day_name}s.",
-                'available_slots': ["Check specific times in manual booking"]
-            }
+    try:
+        duration_hours = float(form_data.get('duration') or 1.5)  # 1.5h if not specified
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(duration_hours) or duration_hours <= 0:  # float() also takes 'nan' / 'inf'
+        return None
+    try:
+        duration_minutes = int(round(duration_hours * 60))
+    except OverflowError:  # e.g. 1e308 hours
+        return None
+    if duration_minutes <= 0:
+        return None
 
-    return None
+    windows = find_free_windows(req_date, duration_minutes)
+    if not windows:
+        return None
+
+    best = windows[0]
+    reason = (f"{best['room_name']} is free from {best['start']} until {best['gap_end']} "
+              f"on {day_name}, which fits your {duration_hours:g} hour slot.")
+    if best['needs_approval']:
+        reason += " This runs past 6 PM, so it will need admin approval."
+
+    return {
+        'room_name': best['room_name'],
+        'capacity': best['capacity'],
+        'reason': reason,
+        'available_slots': [f"{best['start']} - {best['end']}"],
+        'alternatives': windows[1:]
+    }
+
+# Shared by every chat request; rebuilt only after a booking/message/room write.
+_facility_snapshot = VersionedValue(('bookings', 'messages', 'rooms'))
+
+def _build_room_status_context(today):
+    # --- PART 1: ROOMS ---
+    # One aggregated query: every active room + how many confirmed bookings it has today
+    rooms = (
+        db.session.query(
+            RoomsList.name, RoomsList.location, RoomsList.capacity, RoomsList.amenities,
+            func.count(BookingsNew.id)
+        )
+        .outerjoin(BookingsNew, and_(
+            BookingsNew.room_id == RoomsList.id,
+            BookingsNew.booking_date == today,
+            BookingsNew.status == 'Confirmed'
+        ))
+        .filter(RoomsList.is_active == True)
+        .group_by(RoomsList.id, RoomsList.name, RoomsList.location, RoomsList.capacity, RoomsList.amenities)
+        .order_by(RoomsList.id)
+        .all()
+    )
+
+    lines = ["--- 🏥 CURRENT FACILITY STATUS ---\n"]
+    for name, location, capacity, amenities, confirmed_today in rooms:
+        status = "OCCUPIED" if confirmed_today else "AVAILABLE"
+        lines.append(f"- {name} ({location}): {status} | "
+                     f"Cap: {capacity} | "
+                     f"Has: {amenities}\n")
+
+    # --- PART 2: FEEDBACK / MESSAGES (NEW) ---
+    # We fetch the last 10 messages so the AI knows what people are talking about
+    recent_messages = (
+        Messages.query.with_entities(Messages.name, Messages.content)
+        .order_by(Messages.timestamp.desc()).limit(10).all()
+    )
+
+    lines.append("\n--- 🗣️ RECENT STUDENT FEEDBACK ---\n")
+    if recent_messages:
+        for name, content in recent_messages:
+            # We include the name so the AI can say "Ali said..."
+            lines.append(f"- {name} said: '{content}'\n")
+    else:
+        lines.append("No recent feedback found.\n")
+
+    return "".join(lines)
 
 def get_room_status_context():
     """
     Fetches real-time data: 
     1. Rooms & Availability
     2. Recent User Feedback (Messages)
+    The text is cached and shared between requests until bookings,
+    messages or rooms change (or the day rolls over).
     """
-    # --- PART 1: ROOMS ---
-    rooms = RoomsList.query.filter_by(is_active=True).all()
     today = datetime.utcnow().date()
+    return _facility_snapshot.get(lambda: _build_room_status_context(today), extra_key=today)
+
+def build_chat_prompt(user_message):
+    """Returns (prompt, data_version) for a CampusBuddy chat message."""
+    db_context = get_room_status_context()
+    current_date = datetime.utcnow().strftime("%A, %Y-%m-%d")
     
-    context_text = "--- 🏥 CURRENT FACILITY STATUS ---\n"
+    # --- THE NEW "CHILL" SYSTEM PROMPT ---
+    prompt = f"""
+    You are "CampusBuddy", a super chill, friendly, and helpful AI assistant for the university.
     
-    for room in rooms:
-        # Check active bookings
-        active_booking = BookingsNew.query.filter_by(
-            room_id=room.id, 
-            booking_date=today, 
-            status='Confirmed'
-        ).first()
-        status = "OCCUPIED" if active_booking else "AVAILABLE"
-        
-        context_text += (f"- {room.name} ({room.location}): {status} | "
-                         f"Cap: {room.capacity} | "
-                         f"Has: {room.amenities}\n")
-
-    # --- PART 2: FEEDBACK / MESSAGES (NEW) ---
-    # We fetch the last 10 messages so the AI knows what people are talking about
-    recent_messages = Messages.query.order_by(Messages.timestamp.desc()).limit(10).all()
+    YOUR VIBE:
+    - Talk like a normal human student, not a corporate robot. 
+    - Use emojis 🤙✨.
+    - Be concise but warm.
+    - If someone thanks you, say "No worries!" or "Anytime!".
     
-    context_text += "\n--- 🗣️ RECENT STUDENT FEEDBACK ---\n"
-    if recent_messages:
-        for msg in recent_messages:
-            # We include the name so the AI can say "Ali said..."
-            context_text += f"- {msg.name} said: '{msg.content}'\n"
-    else:
-        context_text += "No recent feedback found.\n"
-
-    return context_text
+    YOUR KNOWLEDGE (Real-Time Database):
+    {db_context}
+    
+    SYSTEM RULES:
+    1. **Rooms**: If a room is AVAILABLE, tell them they can book it. 
+       (Link: <a href="/bookings" class="btn btn-sm btn-success">Book Now</a>).
+    2. **Feedback**: You have access to the 'Recent Student Feedback' section above.
+       - If the user asks "What are people saying?" or "Any feedback?", summarize the recent messages.
+       - Be honest. If people are complaining about AC, say "Yeah, a few people mentioned the AC is broken."
+       - If the feedback is good, hype it up!
+    3. **The 6 PM Rule**: If they want a room late (after 6 PM), remind them gently that they need Admin approval.
+    
+    USER SAYS: "{user_message}"
+    """
+    return prompt, cache.version('bookings', 'messages', 'rooms')
 
 def generate_gemini_response(user_message):
     try:
-        db_context = get_room_status_context()
-        current_date = datetime.utcnow().strftime("%A, %Y-%m-%d")
-        
-        # --- THE NEW "CHILL" SYSTEM PROMPT ---
-        prompt = f"""
-        You are "CampusBuddy", a super chill, friendly, and helpful AI assistant for the university.
-        
-        YOUR VIBE:
-        - Talk like a normal human student, not a corporate robot. 
-        - Use emojis 🤙✨.
-        - Be concise but warm.
-        - If someone thanks you, say "No worries!" or "Anytime!".
-        
-        YOUR KNOWLEDGE (Real-Time Database):
-        {db_context}
-        
-        SYSTEM RULES:
-        1. **Rooms**: If a room is AVAILABLE, tell them they can book it. 
-           (Link: <a href="/bookings" class="btn btn-sm btn-success">Book Now</a>).
-        2. **Feedback**: You have access to the 'Recent Student Feedback' section above.
-           - If the user asks "What are people saying?" or "Any feedback?", summarize the recent messages.
-           - Be honest. If people are complaining about AC, say "Yeah, a few people mentioned the AC is broken."
-           - If the feedback is good, hype it up!
-        3. **The 6 PM Rule**: If they want a room late (after 6 PM), remind them gently that they need Admin approval.
-        
-        USER SAYS: "{user_message}"
-        """
-        
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        prompt, data_version = build_chat_prompt(user_message)
+        response = llm.generate(prompt, data_version=data_version)
+        return response.strip()
         
     except Exception as e:
         print(f"Gemini API Error: {e}")
-        return "My brain is buffering right now 😵‍💫. Try again in a sec!"
+        return CHATBOT_FALLBACK_REPLY
 
 # =========================================================
 #  AI FEATURE ROUTES
@@ -308,6 +269,41 @@ def chatbot_api():
     ai_reply = generate_gemini_response(user_message)
     return jsonify({'response': ai_reply})
 
+def _sse(data, event=None):
+    payload = f"data: {json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+@views.route('/api/chatbot-stream', methods=['POST'])
+@login_required
+def chatbot_stream_api():
+    """
+    Streaming variant of /api/chatbot-response (Server-Sent Events).
+    Sends `data: {"token": ...}` chunks as Gemini generates them, then an
+    `event: done` (or `event: error`) message. If the browser goes away the
+    server closes this generator and the upstream stream is dropped with it.
+    """
+    if not request.is_json:
+        return jsonify({"error": "Missing JSON"}), 400
+    user_message = request.json.get('message', '')
+    # Build the prompt now, while the request context (DB session) is active
+    prompt, data_version = build_chat_prompt(user_message)
+
+    def events():
+        try:
+            # closing() makes sure the upstream stream is dropped even if we are cut off mid-way
+            with closing(llm.stream(prompt, data_version=data_version, timeout=CHATBOT_STREAM_TIMEOUT)) as tokens:
+                for token in tokens:
+                    yield _sse({'token': token})
+            yield _sse({}, event='done')
+        except Exception as e:
+            print(f"Gemini Stream Error: {e}")
+            yield _sse({'error': CHATBOT_FALLBACK_REPLY}, event='error')
+
+    return Response(events(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # don't let nginx buffer the stream
+    })
+
 @views.route('/ai/maintenance')
 @login_required
 def ai_maintenance():
@@ -319,6 +315,7 @@ def ai_maintenance():
 
 @views.route('/ai/insights')
 @login_required
+@read_only
 def ai_insights():
     # 1. Get the Statistical Data (Linear Regression)
     basic_insights = get_availability_insights()
@@ -333,7 +330,8 @@ def ai_insights():
     if feedback_text:
         prompt = f"Summarize the general mood of these student comments in one short, chill sentence: {feedback_text}"
         try:
-            vibe_summary = model.generate_content(prompt).text
+            # Same for every user, so after the first call this is a cache hit
+            vibe_summary = llm.generate(prompt, data_version=cache.version('messages'))
         except:
             vibe_summary = "Unable to read the room right now."
 
@@ -398,6 +396,8 @@ def contact():
         new_message = Messages(name=name, email=email, content=content)
         db.session.add(new_message)
         db.session.commit()
+        cache.bump('messages')
+        jobs.nudge(maintenance.JOB_NAME)
         flash('Your message has been sent!', category='success')
         return redirect(url_for('views.contact'))
     return render_template('base.html')
@@ -408,6 +408,7 @@ def contact():
 
 @views.route('/view-rooms', methods=['GET'])
 @login_required
+@read_only
 def view_rooms():
     min_capacity = request.args.get('capacity', type=int)
     location = request.args.get('location', '')
@@ -443,6 +444,7 @@ def manage_rooms():
             new_room = RoomsList(name=name, capacity=capacity, location=location, amenities=amenities, is_active=True)
             db.session.add(new_room)
             db.session.commit()
+            cache.bump('rooms')
             flash('Room added successfully!', 'success')
             
         elif 'delete_room' in request.form:
@@ -451,6 +453,7 @@ def manage_rooms():
             if room_to_delete:
                 room_to_delete.is_active = False # Soft delete
                 db.session.commit()
+                cache.bump('rooms')
                 flash('Room deactivated!', 'success')
             else:
                 flash('Room not found!', 'error')
@@ -460,6 +463,40 @@ def manage_rooms():
     rooms = RoomsList.query.filter_by(is_active=True).all()
     return render_template('manage_rooms.html', rooms=rooms)
 
+@views.route('/admin/timetable-import', methods=['POST'])
+@login_required
+def import_timetable():
+    # Admin upload of the registrar's timetable (CSV / ICS), streamed in batches (timetable_import.py)
+    if current_user.role != 'admin':
+        return redirect(url_for('views.home'))
+
+    upload = request.files.get('timetable')
+    wants_json = request.accept_mimetypes.best == 'application/json'
+    if upload is None or not upload.filename:
+        if wants_json:
+            return jsonify({'error': 'No file uploaded.'}), 400
+        flash('Choose a CSV or ICS file to import.', category='error')
+        return redirect(url_for('views.manage_rooms'))
+
+    try:
+        # werkzeug keeps big uploads in a temp file, we read it line by line
+        report = timetable_import.import_timetable(
+            timetable_import.text_lines(upload.stream),
+            timetable_import.detect_format(upload.filename),
+            replace=request.form.get('replace') == 'true'
+        )
+    except (ValueError, UnicodeDecodeError) as e:
+        if wants_json:
+            return jsonify({'error': str(e)}), 400
+        flash(f'Import failed: {e}', category='error')
+        return redirect(url_for('views.manage_rooms'))
+
+    if wants_json:
+        return jsonify(report.to_dict())
+    flash(report.summary(), category='error' if report.rejected_count else 'success')
+    rooms = RoomsList.query.filter_by(is_active=True).all()
+    return render_template('manage_rooms.html', rooms=rooms, import_report=report)
+
 @views.route('/bookings', methods=['GET'])
 @login_required
 def bookings():
@@ -477,23 +514,38 @@ def book_room_new():
     reason = request.form.get('reason')
 
     try:
+        room_id = int(room_id)
         booking_date = datetime.strptime(date_str, "%Y-%m-%d").date()
         start_time = datetime.strptime(start_str, "%H:%M").time()
         end_time = datetime.strptime(end_str, "%H:%M").time()
-    except ValueError:
+    except (TypeError, ValueError):
         flash('Invalid date or time format.', category='error')
         return redirect(url_for('views.bookings'))
 
+    if end_time <= start_time:
+        flash('End time must be after the start time.', category='error')
+        return redirect(url_for('views.bookings'))
+
     # Logic: The 6 PM Rule
     status = 'Confirmed'
-    six_pm = time(18, 0)
     
-    if start_time >= six_pm or end_time > six_pm:
+    if needs_approval(start_time, end_time):
         status = 'Pending'
         if not reason:
             flash('Applications for evening slots (after 6 PM) must include a reason.', category='error')
             return redirect(url_for('views.bookings'))
 
+    # Lock the room and make sure nothing overlaps (see booking.py).
+    # Evening requests only clash with confirmed slots - admins pick between competing ones.
+    try:
+        check_slot(room_id, booking_date, start_time, end_time, include_pending=(status == 'Confirmed'))
+    except BookingConflict as conflict:
+        db.session.rollback()
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(conflict.to_dict()), 409
+        flash(conflict.describe(), category='error')
+        return redirect(url_for('views.bookings'))
+
     new_booking = BookingsNew(
         user_id=current_user.id,
         room_id=room_id,
@@ -506,7 +558,10 @@ def book_room_new():
     
     try:
         db.session.add(new_booking)
+        analytics.record_bookings([new_booking])
         db.session.commit()
+        occupancy.record_booking(new_booking)
+        cache.bump('bookings')
         if status == 'Pending':
             flash('Request submitted! Waiting for Admin Approval.', category='success')
         else:
@@ -518,61 +573,300 @@ def book_room_new():
 
     return redirect(url_for('views.student_portal'))
 
+def _parse_occurrences(data):
+    """Turns a bulk booking request body into a list of occurrence dicts (raises InvalidRequest / KeyError)."""
+    def to_date(value, name):
+        try:
+            return datetime.strptime(value, "%Y-%m-%d").date()
+        except (TypeError, ValueError):
+            raise InvalidRequest(f"'{name}' must be a date (YYYY-MM-DD).") from None
+
+    def to_time(value, name):
+        try:
+            return datetime.strptime(value, "%H:%M").time()
+        except (TypeError, ValueError):
+            raise InvalidRequest(f"'{name}' must be a time (HH:MM).") from None
+
+    def to_number(value, name):
+        if isinstance(value, str) and value.isascii() and value.isdigit():
+            value = int(value)
+        if not isinstance(value, int) or isinstance(value, bool) or not 0 <= value < 2 ** 31:
+            raise InvalidRequest(f"'{name}' must be a number.")
+        return value
+
+    def to_list(value, name):
+        if not isinstance(value, list):
+            raise InvalidRequest(f"'{name}' must be a list.")
+        return value
+
+    occurrences = []
+    if 'slots' in data:
+        for slot in to_list(data['slots'], 'slots'):
+            if not isinstance(slot, dict):
+                raise InvalidRequest("Each slot must be an object.")
+            occurrences.append({
+                'room_id': to_number(slot['room_id'], 'room_id'),
+                'booking_date': to_date(slot['date'], 'date'),
+                'start_time': to_time(slot['start_time'], 'start_time'),
+                'end_time': to_time(slot['end_time'], 'end_time')
+            })
+    else:
+        room_ids = [to_number(r, 'room_ids') for r in to_list(data['room_ids'], 'room_ids')] \
+            if 'room_ids' in data else [to_number(data['room_id'], 'room_id')]
+        start_time, end_time = to_time(data['start_time'], 'start_time'), to_time(data['end_time'], 'end_time')
+        if 'dates' in data:
+            dates = [to_date(d, 'dates') for d in to_list(data['dates'], 'dates')]
+        else:
+            rule = data['recurrence']
+            if not isinstance(rule, dict):
+                raise InvalidRequest("'recurrence' must be an object.")
+            dates = expand_recurrence(
+                to_date(rule['start_date'], 'start_date'),
+                until=to_date(rule['until'], 'until') if rule.get('until') is not None else None,
+                count=to_number(rule['count'], 'count') if rule.get('count') is not None else None,
+                interval_weeks=to_number(rule.get('interval_weeks', 1), 'interval_weeks'),
+                weekdays=rule.get('weekdays')
+            )
+        for room_id in room_ids:
+            for d in dates:
+                occurrences.append({'room_id': room_id, 'booking_date': d,
+                                    'start_time': start_time, 'end_time': end_time})
+
+    if not occurrences:
+        raise InvalidRequest("No occurrences to book.")
+    for o in occurrences:
+        if o['end_time'] <= o['start_time']:
+            raise InvalidRequest("End time must be after the start time.")
+    return occurrences
+
+@views.route('/api/bookings/bulk', methods=['POST'])
+@login_required
+def book_rooms_bulk():
+    """
+    BULK / RECURRING BOOKINGS (faculty & admin). JSON body, either explicit slots:
+        {"slots": [{"room_id": 3, "date": "2025-09-01", "start_time": "10:00", "end_time": "11:30"}]}
+    or the same time across rooms, on a list of dates or a weekly recurrence:
+        {"room_ids": [3, 4], "start_time": "10:00", "end_time": "11:30",
+         "recurrence": {"start_date": "2025-09-01", "until": "2025-12-08",
+                        "weekdays": ["Monday", "Wednesday"], "interval_weeks": 1}}
+    Optional: "reason" (required for slots after 6 PM), "all_or_nothing".
+    Every occurrence is checked in one query and accepted ones go in with one
+    multi-row INSERT; the reply lists accepted and conflicting occurrences.
+    """
+    if current_user.role not in ('faculty', 'admin'):
+        return jsonify({'error': 'Only faculty and admins can book in bulk.'}), 403
+    if not request.is_json:
+        return jsonify({"error": "Missing JSON"}), 400
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object.'}), 400
+
+    if not isinstance(data.get('reason') or '', str):
+        return jsonify({'error': "'reason' must be text."}), 400
+
+    try:
+        occurrences = _parse_occurrences(data)
+        accepted, conflicts = create_bulk(current_user.id, occurrences, reason=data.get('reason'),
+                                          all_or_nothing=bool(data.get('all_or_nothing')))
+        if accepted:
+            analytics.record_bookings(accepted)
+        db.session.commit()
+    except InvalidRequest as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except KeyError as e:  # a required field is missing from the body / a slot / the recurrence
+        db.session.rollback()
+        return jsonify({'error': f"Missing field: {e.args[0]}"}), 400
+
+    if accepted:
+        for d in {o['booking_date'] for o in accepted}:
+            occupancy.invalidate(d)
+        cache.bump('bookings')
+
+    describe = lambda o: {'room_id': int(o['room_id']), 'date': o['booking_date'].isoformat(),
+                          'start_time': o['start_time'].strftime("%H:%M"),
+                          'end_time': o['end_time'].strftime("%H:%M")}
+    body = {
+        'accepted': [dict(describe(o), id=o['id'], status=o['status']) for o in accepted],
+        'conflicts': [dict(describe(o), clashes=clashes) for o, clashes in conflicts],
+        'summary': {'requested': len(occurrences), 'accepted': len(accepted), 'conflicting': len(conflicts)}
+    }
+    return jsonify(body), (201 if accepted else 409)
+
 @views.route('/api/get-availability', methods=['POST'])
 @login_required
 def get_availability():
-    data = request.get_json()
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object.'}), 400
     room_id = data.get('room_id')
     date_str = data.get('date')
     
     if not room_id or not date_str:
         return jsonify({'error': 'Missing data'}), 400
 
-    target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
-    day_name = target_date.strftime("%A")
-
-    blocked_slots = []
-
-    # --- 1. SEMESTER DATE RANGE LOGIC ---
-    # Define the bounds for your semester
-    semester_start = date(2025, 9, 1)
-    semester_end = date(2025, 12, 31)
-
-    # Only check for fixed classes if the selected date is within the semester
-    if semester_start <= target_date <= semester_end:
-        # A. Check Semester Schedule (Fixed Classes)
-        classes = SemesterSchedule.query.filter_by(room_id=room_id, day_of_week=day_name).all()
-        for cls in classes:
-            blocked_slots.append({
-                'start': cls.start_time.strftime("%H:%M"),
-                'end': cls.end_time.strftime("%H:%M"),
-                'reason': f"Class: {cls.course_name}"
-            })
-
-    # --- 2. REGULAR BOOKINGS LOGIC ---
-    # Check one-off bookings regardless of the date (always relevant)
-    existing_bookings = BookingsNew.query.filter_by(
-        room_id=room_id, 
-        booking_date=target_date
-    ).filter(BookingsNew.status != 'Rejected').all()
-    
-    for b in existing_bookings:
-        blocked_slots.append({
-            'start': b.start_time.strftime("%H:%M"),
-            'end': b.end_time.strftime("%H:%M"),
-            'reason': "Booked"
-        })
+    try:
+        target_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        room_id = int(room_id)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Invalid room or date'}), 400
 
-    # Sort all blocks chronologically
-    blocked_slots.sort(key=lambda x: x['start'])
+    # Served from the in-memory occupancy index (see occupancy.py):
+    # class meetings of that date (semester calendar) + non-rejected bookings, already sorted.
+    blocked_slots = occupancy.blocked_slots(room_id, target_date)
     return jsonify({'blocked_slots': blocked_slots})
 
+GRID_MAX_ROOMS = 200
+GRID_MAX_DAYS = 31
+
+@views.route('/api/availability/grid', methods=['POST'])
+@login_required
+def get_availability_grid():
+    """
+    WEEK VIEW: blocked intervals for many rooms and days in one call. JSON body:
+        {"room_ids": [1, 2, 3], "start_date": "2025-10-06", "end_date": "2025-10-12",
+         "bitsets": false, "slot_minutes": 30}
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object.'}), 400
+    try:
+        if not isinstance(data.get('room_ids') or [], list):
+            raise TypeError  # a string would be read digit by digit
+        room_ids = [int(r) for r in data.get('room_ids') or []]
+        start_date = datetime.strptime(data.get('start_date', ''), "%Y-%m-%d").date()
+        end_date = datetime.strptime(data.get('end_date') or data.get('start_date', ''), "%Y-%m-%d").date()
+        slot_minutes = int(data.get('slot_minutes', 30))
+    except (TypeError, ValueError):
+        return jsonify({'error': "'room_ids' (list) and 'start_date' / 'end_date' (YYYY-MM-DD) are required."}), 400
+
+    if not room_ids or end_date < start_date:
+        return jsonify({'error': 'Give at least one room and an end date on or after the start date.'}), 400
+    if len(room_ids) > GRID_MAX_ROOMS or (end_date - start_date).days + 1 > GRID_MAX_DAYS:
+        return jsonify({'error': f'At most {GRID_MAX_ROOMS} rooms and {GRID_MAX_DAYS} days per request.'}), 400
+    if slot_minutes not in (15, 30, 60):
+        return jsonify({'error': "'slot_minutes' must be 15, 30 or 60."}), 400
+
+    bitsets = bool(data.get('bitsets'))
+    grid = availability_grid(room_ids, start_date, end_date, bitsets=bitsets, slot_minutes=slot_minutes)
+    reply = {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'rooms': {str(room_id): days for room_id, days in grid.items()}
+    }
+    if bitsets:
+        reply.update({'day_open': f"{DAY_OPEN // 60:02d}:00", 'slot_minutes': slot_minutes,
+                      'slots': (DAY_CLOSE - DAY_OPEN) // slot_minutes})
+    return jsonify(reply)
+
+@views.route('/api/rooms/free', methods=['GET'])
+@login_required
+def search_free_rooms():
+    """
+    FREE ROOM SEARCH: every room free for one time window, in one query.
+    GET ?date=2025-10-06&start=10:00&end=12:00&min_capacity=30&location=Block A
+        &amenities=projector,wifi&limit=50
+    """
+    try:
+        target_date = datetime.strptime(request.args.get('date', ''), "%Y-%m-%d").date()
+        start_time = datetime.strptime(request.args.get('start', ''), "%H:%M").time()
+        end_time = datetime.strptime(request.args.get('end', ''), "%H:%M").time()
+    except ValueError:
+        return jsonify({'error': "'date' (YYYY-MM-DD), 'start' and 'end' (HH:MM) are required."}), 400
+    if end_time <= start_time:
+        return jsonify({'error': 'End time must be after the start time.'}), 400
+
+    min_capacity = request.args.get('min_capacity', type=int)
+    amenities = [a.strip() for a in request.args.get('amenities', '').split(',') if a.strip()]
+    limit = max(1, min(request.args.get('limit', 50, type=int), 500))
+
+    rooms = find_free_rooms(target_date, start_time, end_time, min_capacity=min_capacity,
+                            location=request.args.get('location', '').strip() or None,
+                            amenities=amenities, limit=limit)
+    return jsonify({
+        'date': target_date.isoformat(),
+        'start': start_time.strftime('%H:%M'),
+        'end': end_time.strftime('%H:%M'),
+        'needs_approval': needs_approval(start_time, end_time),
+        'rooms': rooms
+    })
+
+# =========================================================
+#  PAGINATED LISTINGS (keyset cursors, see pagination.py)
+# =========================================================
+
+def _booking_json(b):
+    return {
+        'id': b.id,
+        'room_id': b.room_id,
+        'room_name': b.room.name,
+        'user_id': b.user_id,
+        'date': b.booking_date.isoformat(),
+        'start_time': b.start_time.strftime('%H:%M'),
+        'end_time': b.end_time.strftime('%H:%M'),
+        'status': b.status,
+        'reason': b.reason
+    }
+
+def _message_json(m):
+    return {
+        'id': m.id,
+        'name': m.name,
+        'email': m.email,
+        'content': m.content,
+        'timestamp': m.timestamp.isoformat() if m.timestamp else None,
+        'seen': bool(m.seen)
+    }
+
+def my_bookings_page(cursor=None, limit=None):
+    # Newest first; room loaded in the same query so the template doesn't hit the DB per row.
+    # Older pages carry on into the archived bookings (archive.py).
+    current = BookingsNew.query.options(joinedload(BookingsNew.room)).filter_by(user_id=current_user.id)
+    archived = BookingArchive.query.options(joinedload(BookingArchive.room)).filter_by(user_id=current_user.id)
+    return keyset_page_many([(current, BookingsNew.booking_date, BookingsNew.id),
+                             (archived, BookingArchive.booking_date, BookingArchive.id)],
+                            cursor=cursor, limit=page_size(limit), descending=True)
+
+def pending_bookings_page(cursor=None, limit=None):
+    # Oldest date first, so the most urgent requests are on page 1
+    query = (BookingsNew.query
+             .options(joinedload(BookingsNew.room), joinedload(BookingsNew.user))
+             .filter_by(status='Pending'))
+    return keyset_page(query, BookingsNew.booking_date, BookingsNew.id,
+                       cursor=cursor, limit=page_size(limit))
+
+def messages_page(cursor=None, limit=None):
+    return keyset_page(Messages.query, Messages.timestamp, Messages.id,
+                       cursor=cursor, limit=page_size(limit), descending=True)
+
+def _json_page(page_fn, serialize):
+    try:
+        rows, next_cursor = page_fn(request.args.get('cursor'), request.args.get('limit'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor.'}), 400
+    return jsonify({'items': [serialize(r) for r in rows], 'next_cursor': next_cursor})
+
+def _html_page(page_fn):
+    """Bad/stale cursors in a link just start again from the first page."""
+    try:
+        return page_fn(request.args.get('cursor'), request.args.get('limit'))
+    except ValueError:
+        flash('That page link is no longer valid, showing the first page.', category='error')
+        return page_fn()
+
 @views.route('/my-bookings')
 @login_required
 def view_my_bookings():
     # Use the new table and new template
-    bookings = BookingsNew.query.filter_by(user_id=current_user.id).order_by(BookingsNew.booking_date.desc()).all()
-    return render_template('my_bookings.html', bookings=bookings)
+    bookings, next_cursor = _html_page(my_bookings_page)
+    return render_template('my_bookings.html', bookings=bookings, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('cursor'))
+
+@views.route('/api/my-bookings')
+@login_required
+def my_bookings_api():
+    """GET ?cursor=...&limit=25 -> {"items": [...], "next_cursor": "..." or null}"""
+    return _json_page(my_bookings_page, _booking_json)
 
 # =========================================================
 #  ADMIN MANAGEMENT ROUTES
@@ -584,8 +878,16 @@ def view_contact_messages():
     if current_user.role != 'admin':
         flash('Access denied.')
         return redirect(url_for('views.home'))
-    messages = Messages.query.order_by(Messages.timestamp.desc()).all()
-    return render_template('view_contact_messages.html', messages=messages)
+    messages, next_cursor = _html_page(messages_page)
+    return render_template('view_contact_messages.html', messages=messages, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('cursor'))
+
+@views.route('/api/admin/messages')
+@login_required
+def messages_api():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Access denied.'}), 403
+    return _json_page(messages_page, _message_json)
 
 @views.route('/admin/mark-seen/<int:message_id>', methods=['POST'])
 @login_required
@@ -596,6 +898,7 @@ def mark_message_seen(message_id):
     message = Messages.query.get_or_404(message_id)
     message.seen = True
     db.session.commit()
+    cache.bump('messages')
     flash('Message marked as seen.')
     return redirect(url_for('views.view_contact_messages'))
 
@@ -607,8 +910,16 @@ def pending_bookings():
         return redirect(url_for('views.home'))
     
     # Fetch from the NEW table (BookingsNew)
-    bookings = BookingsNew.query.filter_by(status='Pending').order_by(BookingsNew.booking_date).all()
-    return render_template('admin_approvals.html', bookings=bookings)
+    bookings, next_cursor = _html_page(pending_bookings_page)
+    return render_template('admin_approvals.html', bookings=bookings, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('cursor'))
+
+@views.route('/api/admin/pending-bookings')
+@login_required
+def pending_bookings_api():
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Access denied.'}), 403
+    return _json_page(pending_bookings_page, _booking_json)
 
 @views.route('/admin/handle-approval/<int:booking_id>/<string:action>', methods=['POST'])
 @login_required
@@ -620,6 +931,14 @@ def handle_approval(booking_id, action):
     booking = BookingsNew.query.get_or_404(booking_id)
 
     if action == 'approve':
+        # Another request (or a class) may have taken the slot since this one was made
+        try:
+            check_slot(booking.room_id, booking.booking_date, booking.start_time, booking.end_time,
+                       include_pending=False, ignore_id=booking.id)
+        except BookingConflict as conflict:
+            db.session.rollback()
+            flash(f'Cannot approve: {conflict.describe()}', category='error')
+            return redirect(url_for('views.pending_bookings'))
         booking.status = 'Confirmed'
         flash(f'Booking for {booking.user.first_name} approved!', category='success')
     elif action == 'deny':
@@ -627,42 +946,170 @@ def handle_approval(booking_id, action):
         flash('Booking request denied.', category='error')
 
     db.session.commit()
+    occupancy.record_booking(booking)
+    cache.bump('bookings')
     return redirect(url_for('views.pending_bookings'))
 
+@views.route('/api/admin/bookings/batch-approval', methods=['POST'])
+@login_required
+def batch_approval_api():
+    """
+    BATCH APPROVALS (admin). JSON body:
+        {"approve": [12, 15], "deny": [13], "auto_reject_conflicts": true}
+    Everything happens in one transaction; the reply has one outcome per id.
+    """
+    if current_user.role != 'admin':
+        return jsonify({'error': 'Access denied.'}), 403
+    if not request.is_json:
+        return jsonify({"error": "Missing JSON"}), 400
+    data = request.json
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object.'}), 400
+
+    try:
+        outcomes, changed_dates = apply_approvals(
+            data.get('approve', []), data.get('deny', []),
+            auto_reject_conflicts=bool(data.get('auto_reject_conflicts'))
+        )
+        db.session.commit()
+    except InvalidRequest as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+    for d in changed_dates:
+        occupancy.invalidate(d)
+    if changed_dates:
+        cache.bump('bookings')
+
+    summary = {}
+    for o in outcomes:
+        summary[o['outcome']] = summary.get(o['outcome'], 0) + 1
+    return jsonify({'results': sorted(outcomes, key=lambda o: o['id']), 'summary': summary})
+
+# Dashboard numbers per (user_type, date) filter; rebuilt after booking/room writes
+_dashboard_stats = VersionedCache(('bookings', 'rooms'), max_age=30)
+
+def get_dashboard_stats(user_type_filter, parsed_date):
+    """
+    One grouped query on (role, room) for the admin dashboard (plus the same
+    one on the archived bookings). Both the role counts and the room counts
+    are derived from it, so both respect the filters.
+    """
+    role_counts = {'student': 0, 'faculty': 0, 'admin': 0}
+    room_counts = {}
+    for table in (BookingsNew, BookingArchive):
+        query = (
+            db.session.query(Users.role, RoomsList.name, func.count(table.id))
+            .join(Users, table.user_id == Users.id)
+            .join(RoomsList, table.room_id == RoomsList.id)
+        )
+        if user_type_filter:
+            query = query.filter(Users.role == user_type_filter)
+        if parsed_date:
+            query = query.filter(table.booking_date >= parsed_date)
+
+        for role, room_name, count in query.group_by(Users.role, RoomsList.name).all():
+            role_counts[role] = role_counts.get(role, 0) + count
+            room_counts[room_name] = room_counts.get(room_name, 0) + count
+
+    return {
+        'user_type_data': [role_counts['student'], role_counts['faculty'], role_counts['admin']],
+        'room_labels': list(room_counts.keys()),
+        'room_data': list(room_counts.values())
+    }
+
 @views.route('/admin/admin_dashboard')
 @login_required
+@read_only
 def admin_dashboard():
     # Updated to use BookingsNew
-    user_type_filter = request.args.get('user_type')
+    user_type_filter = request.args.get('user_type') or None
     date_filter = request.args.get('date')
-    base_query = BookingsNew.query.join(Users)
+    parsed_date = None
 
-    if user_type_filter:
-        base_query = base_query.filter(Users.role == user_type_filter)
     if date_filter:
         try:
             parsed_date = datetime.strptime(date_filter, "%Y-%m-%d").date()
-            base_query = base_query.filter(BookingsNew.booking_date >= parsed_date)
         except ValueError:
             flash("Invalid date format. Use YYYY-MM-DD.", category="error")
 
-    student_count = BookingsNew.query.join(Users).filter(Users.role == 'student').count()
-    faculty_count = BookingsNew.query.join(Users).filter(Users.role == 'faculty').count()
-    admin_count = BookingsNew.query.join(Users).filter(Users.role == 'admin').count()
-    user_type_data = [student_count, faculty_count, admin_count]
-
-    room_stats = (
-        base_query
-        .join(RoomsList, BookingsNew.room_id == RoomsList.id)
-        .with_entities(RoomsList.name, func.count(BookingsNew.id))
-        .group_by(RoomsList.name)
-        .all()
+    stats = _dashboard_stats.get(
+        (user_type_filter, parsed_date),
+        lambda: get_dashboard_stats(user_type_filter, parsed_date)
     )
-    room_labels = [room[0] for room in room_stats]
-    room_data = [room[1] for room in room_stats]
 
     return render_template('admin_statistics.html',
-                           user_type_data=user_type_data,
-                           room_labels=room_labels,
-                           room_data=room_data,
-                           back_url=url_for('views.admin_portal'))
\ No newline at end of file
+                           user_type_data=stats['user_type_data'],
+                           room_labels=stats['room_labels'],
+                           room_data=stats['room_data'],
+                           back_url=url_for('views.admin_portal'))
+
+@views.route('/admin/metrics')
+def metrics_endpoint():
+    """
+    METRICS (Prometheus text format, see metrics.py). Open to logged-in admins,
+    or to a scraper sending "Authorization: Bearer <METRICS_TOKEN>".
+    """
+    token = current_app.config.get('METRICS_TOKEN')
+    sent = request.headers.get('Authorization', '')
+    token_ok = bool(token) and hmac.compare_digest(sent.encode(), f'Bearer {token}'.encode())
+    is_admin = current_user.is_authenticated and current_user.role == 'admin'
+    if not (token_ok or is_admin):
+        return Response('Access denied.\n', status=403, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# =========================================================
+#  EXPORTS (streamed CSV / iCalendar, see exports.py)
+# =========================================================
+
+def _streamed(chunks, mimetype, etag, last_modified, filename=None):
+    # 304 if the client's copy is still current - the generator then never runs a query
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'  # always revalidate, it's cheap
+    if filename:
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response.make_conditional(request)
+
+@views.route('/admin/export/bookings.csv')
+@login_required
+@read_only
+def export_bookings_csv():
+    # Booking history for the facilities team: ?room_id=&user_id=&status=&from=&to=
+    if current_user.role != 'admin':
+        flash('Access denied.', category='error')
+        return redirect(url_for('views.home'))
+    try:
+        filters = exports.booking_filters(request.args)
+    except ValueError as e:
+        return Response(f'{e}\n', status=400, mimetype='text/plain')
+
+    etag, last_modified = exports.bookings_fingerprint(filters)
+    return _streamed(exports.bookings_csv(filters), 'text/csv', etag, last_modified, filename='bookings.csv')
+
+@views.route('/rooms/<int:room_id>/calendar.ics')
+@read_only
+def room_calendar_feed(room_id):
+    """
+    iCalendar feed of one room (bookings + class meetings, no personal details).
+    Logged-in users can open it; calendar apps can't log in, so they subscribe
+    with ?token=<CALENDAR_TOKEN>. Optional ?from=&to= (YYYY-MM-DD).
+    """
+    token = current_app.config.get('CALENDAR_TOKEN')
+    sent = request.args.get('token', '')
+    token_ok = bool(token) and hmac.compare_digest(sent.encode(), token.encode())
+    if not (token_ok or current_user.is_authenticated):
+        return Response('Access denied.\n', status=403, mimetype='text/plain')
+
+    room = db.session.get(RoomsList, room_id)
+    if room is None:
+        return Response('Room not found.\n', status=404, mimetype='text/plain')
+    try:
+        start, end = exports.feed_window(request.args)
+    except ValueError as e:
+        return Response(f'{e}\n', status=400, mimetype='text/plain')
+
+    etag, last_modified = exports.room_feed_fingerprint(room, start, end)
+    return _streamed(exports.room_calendar(room, start, end, last_modified), 'text/calendar',
+                     etag, last_modified)
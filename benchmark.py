@@ -0,0 +1,264 @@
+"""
+BENCHMARKS: Times the busiest routes and helpers against a big seeded database.
+
+Each benchmark runs through the Flask test client (or straight against the
+helper inside a request), with Gemini stubbed out so only our own code is
+measured. For every benchmark we record the median / p95 wall time and how
+many SQL statements one call sends.
+
+Cached routes are measured twice: "warm" (what most requests see) and
+"cold" (cache dropped before every call, i.e. the first request after a
+write).
+
+    python benchmark.py                          # 5% of full size, quick
+    python benchmark.py --scale 1                # 1M bookings (seeding takes a while, once)
+    python benchmark.py --update-baseline        # store these numbers as the baseline
+
+If a baseline file exists, results are compared with it and the script
+exits with 1 when something got slower than --tolerance (or sends more
+queries than before). Baselines only make sense on the same machine and
+the same --scale.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time as _time
+from datetime import date, timedelta
+
+from sqlalchemy import event, func
+
+import seed_data
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+NOISE_FLOOR_MS = 1.0  # differences smaller than this are never reported as regressions
+
+
+class StubGemini:
+    """Stands in for the Gemini model: instant, fixed answers."""
+
+    def generate_content(self, prompt, **kwargs):
+        class Reply:
+            text = "Steady demand today, quiet evenings. (benchmark stub)"
+        return Reply()
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+# =========================================================
+#  DATABASE
+# =========================================================
+
+def prepare_database(app, db, sizes, path):
+    """Seeds the database file once; later runs with the same sizes reuse it."""
+    from Website.models import BookingsNew
+
+    sizes_file = path + '.sizes.json'
+    with app.app_context():
+        if os.path.exists(sizes_file):
+            with open(sizes_file) as f:
+                stored = json.load(f)
+            if stored == sizes and db.session.query(func.count(BookingsNew.id)).scalar():
+                print(f"Reusing seeded database {path}")
+                return sizes
+
+        print(f"Seeding {path} (one-off, reused by later runs)")
+        db.drop_all()
+        db.create_all()
+        seed_data.generate(db, sizes)
+        with open(sizes_file, 'w') as f:
+            json.dump(sizes, f)
+        return sizes
+
+
+# =========================================================
+#  BENCHMARKS
+# =========================================================
+
+def build_benchmarks(app, db, client, sizes):
+    """Returns [(name, call, before_each_call_or_None)]."""
+    from Website import views, cache
+    from Website.models import BookingsNew
+    from Website.occupancy import occupancy
+
+    rooms = sizes['rooms']
+    semester_day = date(2025, 10, 6)
+    state = {'n': 0}
+    with app.app_context():
+        # book after everything already in the database (earlier runs included)
+        first_free_day = db.session.query(func.max(BookingsNew.booking_date)).scalar() + timedelta(days=1)
+
+    def availability(days):
+        # warm: a few dates that stay loaded in the occupancy index after the warmup;
+        # cold: a new date every call (the caches are dropped before each call anyway)
+        def call():
+            state['n'] += 1
+            room_id = 1 + (state['n'] * 7919) % rooms
+            day = semester_day + timedelta(days=state['n'] % days)
+            r = client.post('/api/get-availability', json={'room_id': room_id, 'date': day.isoformat()})
+            assert r.status_code == 200, r.status_code
+        return call
+
+    def book_room():
+        # a fresh daytime slot each call, past the seeded data, so every call is a real insert
+        state['n'] += 1
+        day = first_free_day + timedelta(days=state['n'] // rooms)
+        r = client.post('/book-room-new', data={
+            'room_id': 1 + state['n'] % rooms, 'date': day.isoformat(),
+            'start_time': '10:00', 'end_time': '11:00'
+        })
+        assert r.status_code == 302, r.status_code
+
+    def dashboard():
+        r = client.get('/admin/admin_dashboard')
+        assert r.status_code == 200, r.status_code
+
+    def in_request(helper):
+        def call():
+            with app.test_request_context():
+                helper()
+        return call
+
+    def drop_booking_caches():
+        occupancy.invalidate()
+        cache.bump('bookings')
+
+    def drop_room_caches():
+        cache.bump('rooms', 'bookings')
+
+    return [
+        ('get_availability (warm)', availability(3), None),
+        ('get_availability (cold)', availability(60), drop_booking_caches),
+        ('book_room_new', book_room, None),
+        ('admin_dashboard (warm)', dashboard, None),
+        ('admin_dashboard (cold)', dashboard, drop_booking_caches),
+        ('get_availability_insights', in_request(views.get_availability_insights), None),
+        ('get_peak_hour_prediction', in_request(views.get_peak_hour_prediction), None),
+        ('get_room_status_context (warm)', in_request(views.get_room_status_context), None),
+        ('get_room_status_context (cold)', in_request(views.get_room_status_context), drop_room_caches),
+    ]
+
+
+def run_benchmark(call, before, counter, iterations, warmup=3):
+    for _ in range(warmup):
+        if before:
+            before()
+        call()
+
+    timings, queries = [], []
+    for _ in range(iterations):
+        if before:
+            before()
+        counter.count = 0
+        started = _time.perf_counter()
+        call()
+        timings.append((_time.perf_counter() - started) * 1000)
+        queries.append(counter.count)
+
+    timings.sort()
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        'queries': round(statistics.mean(queries), 2),
+        'iterations': iterations,
+    }
+
+
+# =========================================================
+#  BASELINE
+# =========================================================
+
+def compare(results, baseline, tolerance):
+    """Prints a comparison table; returns the names that regressed."""
+    regressions = []
+    print(f"\n{'benchmark':34} {'median':>10} {'baseline':>10} {'change':>8} {'queries':>9}")
+    for name, now in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:34} {now['median_ms']:>8.2f}ms {'(new)':>10}")
+            continue
+        change = (now['median_ms'] - before['median_ms']) / before['median_ms'] if before['median_ms'] else 0.0
+        slower = change > tolerance and now['median_ms'] - before['median_ms'] > NOISE_FLOOR_MS
+        more_queries = now['queries'] > before['queries']
+        flag = '  <-- REGRESSION' if slower or more_queries else ''
+        print(f"{name:34} {now['median_ms']:>8.2f}ms {before['median_ms']:>8.2f}ms {change:>+8.0%} "
+              f"{before['queries']:>4g}->{now['queries']:<4g}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=0.05, help="fraction of the full data size (default 0.05)")
+    for name in seed_data.FULL_SIZES:
+        parser.add_argument(f'--{name}', type=int, help=f"number of {name} (overrides --scale)")
+    parser.add_argument('--db', help="SQLite file to seed/reuse (default instance/benchmark-<scale>.db)")
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--only', help="comma-separated substrings of benchmark names to run")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--update-baseline', action='store_true', help="save these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown before failing (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    sizes = seed_data.scaled_sizes(args.scale, **{name: getattr(args, name) for name in seed_data.FULL_SIZES})
+    db_path = os.path.abspath(args.db or os.path.join('instance', f'benchmark-{args.scale:g}.db'))
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    from Website import create_app, db, llm
+    app = create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path, 'TESTING': True})
+    llm.set_model(StubGemini())
+
+    sizes = prepare_database(app, db, sizes, db_path)
+
+    client = app.test_client()
+    r = client.post('/login', data={'email': 'user1@uni.edu', 'password': seed_data.PASSWORD})
+    assert r.status_code == 302, "could not log in as the seeded admin"
+
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+
+    benchmarks = build_benchmarks(app, db, client, sizes)
+    if args.only:
+        wanted = [w.strip() for w in args.only.split(',')]
+        benchmarks = [b for b in benchmarks if any(w in b[0] for w in wanted)]
+
+    print(f"\nData: {sizes}")
+    results = {}
+    for name, call, before in benchmarks:
+        results[name] = run_benchmark(call, before, counter, args.iterations)
+        r = results[name]
+        print(f"  {name:34} median {r['median_ms']:8.2f}ms   p95 {r['p95_ms']:8.2f}ms   {r['queries']:g} queries")
+
+    report = {'sizes': sizes, 'results': results}
+    exit_code = 0
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get('sizes') != sizes:
+            print(f"\nBaseline {args.baseline} was recorded with different data sizes, not comparing.")
+        else:
+            regressions = compare(results, baseline['results'], args.tolerance)
+            if regressions:
+                print(f"\n{len(regressions)} benchmark(s) regressed against {args.baseline}.")
+                exit_code = 1
+            else:
+                print(f"\nNo regressions against {args.baseline}.")
+    else:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""
+STARTUP BENCHMARK: How long does a fresh worker take to get going?
+
+Starts a new Python process several times and measures, inside it:
+  * import  - `import Website` (+ the views/auth blueprints create_app pulls in)
+  * init    - `create_app()` itself
+and lists any heavy AI / data libraries that ended up loaded at startup
+(they should only load on first use).
+
+    python benchmark_startup.py            # 7 runs, prints the medians
+    python benchmark_startup.py --runs 15
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ['pandas', 'numpy', 'sklearn', 'google.generativeai']
+
+CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+from Website import create_app
+t1 = time.perf_counter()
+create_app({'SQLALCHEMY_DATABASE_URI': %(uri)r, 'TESTING': True})
+t2 = time.perf_counter()
+print(json.dumps({
+    'import_ms': (t1 - t0) * 1000,
+    'init_ms': (t2 - t1) * 1000,
+    'heavy': [m for m in %(heavy)r if m in sys.modules],
+}))
+"""
+
+
+def run_once(uri):
+    code = CHILD % {'uri': uri, 'heavy': HEAVY_MODULES}
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                         cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=7)
+    args = parser.parse_args()
+
+    uri = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db')
+    run_once(uri)  # warm the OS file cache / .pyc files first
+    runs = [run_once(uri) for _ in range(args.runs)]
+
+    imports = statistics.median(r['import_ms'] for r in runs)
+    inits = statistics.median(r['init_ms'] for r in runs)
+    print(f"import Website  {imports:8.1f} ms")
+    print(f"create_app()    {inits:8.1f} ms")
+    print(f"total           {imports + inits:8.1f} ms   (median of {args.runs} runs)")
+    heavy = sorted({m for r in runs for m in r['heavy']})
+    print(f"heavy modules loaded at startup: {', '.join(heavy) if heavy else 'none'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""
+QUERY PLAN CHECK: makes sure the booking hot paths keep using their indexes.
+
+Builds a throwaway SQLite database, fills it with a semester's worth of
+fake data, runs the real app code for each hot path (conflict checks, the
+occupancy day load, the paged listings, the maintenance alerts, a room
+calendar feed), and runs EXPLAIN QUERY PLAN on every SQL statement they send.
+
+A check fails if any watched table is read with a full table scan, or if a
+paged listing has to sort its rows instead of walking an index in order.
+
+Run it after touching models.py or any of these queries:
+    python check_query_plans.py
+Exit code is 1 if anything regressed.
+"""
+import os
+import random
+import sys
+import tempfile
+from datetime import date, datetime, time, timedelta
+
+from flask_login import login_user
+from sqlalchemy import event, insert, text
+
+from Website import create_app, db, semesters, archive
+from Website.models import Users, RoomsList, SemesterSchedule, BookingsNew, Messages
+
+WATCHED_TABLES = ('bookings_new', 'bookings_archive', 'class_occurrence', 'messages')
+
+ROOMS = 30
+USERS = 300
+BOOKINGS = 20000
+MESSAGES = 5000
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+
+
+def seed():
+    rng = random.Random(42)
+    db.session.execute(insert(Users), [{
+        'email': f'user{i}@uni.edu', 'first_name': f'User {i}', 'password': 'x',
+        'role': 'admin' if i == 0 else rng.choice(['student', 'faculty'])
+    } for i in range(USERS)])
+    db.session.execute(insert(RoomsList), [{
+        'name': f'Room {i}', 'capacity': rng.choice([20, 40, 80]), 'is_active': True, 'location': 'Block A'
+    } for i in range(ROOMS)])
+    db.session.execute(insert(SemesterSchedule), [{
+        'room_id': room, 'day_of_week': day, 'start_time': time(h), 'end_time': time(h + 2),
+        'course_name': f'CS{room}{h}'
+    } for room in range(1, ROOMS + 1) for day in DAYS for h in (9, 13)])
+
+    first_day = date(2025, 9, 1)
+    bookings = []
+    for _ in range(BOOKINGS):
+        h = rng.randint(8, 21)
+        bookings.append({
+            'user_id': rng.randint(1, USERS), 'room_id': rng.randint(1, ROOMS),
+            'booking_date': first_day + timedelta(days=rng.randint(0, 120)),
+            'start_time': time(h), 'end_time': time(h + 1) if h < 23 else time(23, 59),
+            'status': rng.choices(['Confirmed', 'Pending', 'Rejected'], weights=[80, 5, 15])[0],
+            'created_at': datetime(2025, 8, 1)
+        })
+    db.session.execute(insert(BookingsNew), bookings)
+
+    start = datetime(2024, 1, 1)
+    db.session.execute(insert(Messages), [{
+        'name': 'Student', 'email': 's@uni.edu', 'content': f'message {i}',
+        'timestamp': start + timedelta(minutes=37 * i), 'seen': rng.random() < 0.9
+    } for i in range(MESSAGES)])
+    db.session.commit()
+    semesters.ensure_calendar()  # Fall 2025 class meetings
+    archive.archive_bookings(date(2025, 9, 15))  # the first two weeks go to bookings_archive
+    # give the planner real statistics, like a long-running database would have
+    db.session.execute(text('ANALYZE'))
+
+
+def capture(fn):
+    """Runs fn() and returns every (sql, params) it sent to the database."""
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return statements
+
+
+def plan_problems(sql, params, ordered):
+    problems = []
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    for row in rows:
+        detail = row[-1]
+        for table in WATCHED_TABLES:
+            if detail == f'SCAN {table}' or detail.startswith(f'SCAN {table} '):
+                if 'USING' not in detail or not ordered:
+                    problems.append(detail)
+        if ordered and 'TEMP B-TREE' in detail:
+            problems.append(detail)
+    return problems, [r[-1] for r in rows]
+
+
+def main():
+    workdir = tempfile.mkdtemp()
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.join(workdir, 'plans.db'),
+        'TESTING': True,
+    })
+
+    from Website import views, maintenance
+    from Website.booking import find_conflicts
+    from Website.occupancy import OccupancyIndex
+    from Website.scheduling import find_free_rooms, availability_grid
+    from Website import exports
+
+    failures = 0
+    with app.app_context():
+        db.create_all()
+        seed()
+        some_day = date(2025, 10, 6)  # a Monday inside the semester
+
+        def room_feed(room, start, end):
+            # ETag query + the whole streamed feed
+            etag, last_modified = exports.room_feed_fingerprint(room, start, end)
+            ''.join(exports.room_calendar(room, start, end, last_modified))
+
+        def page_twice(page_fn):
+            # first page, then the page after its cursor
+            rows, cursor = page_fn()
+            page_fn(cursor)
+
+        # (name, code to run, is it a paged listing that must come back pre-sorted?)
+        checks = [
+            ('conflict check (one slot)',
+             lambda: find_conflicts(5, some_day, time(10), time(11)), False),
+            ('occupancy day load',
+             lambda: OccupancyIndex()._load_date(some_day), False),
+            ('pending count',
+             lambda: BookingsNew.query.filter_by(status='Pending').count(), False),
+            ('my bookings pages',
+             lambda: page_twice(views.my_bookings_page), True),
+            ('pending approval pages',
+             lambda: page_twice(views.pending_bookings_page), True),
+            ('contact message pages',
+             lambda: page_twice(views.messages_page), True),
+            ('critical maintenance alerts',
+             maintenance.critical_alerts, False),
+            ('free room search',
+             lambda: find_free_rooms(some_day, time(10), time(12), min_capacity=30), False),
+            ('week availability grid',
+             lambda: availability_grid(range(1, 11), some_day, some_day + timedelta(days=6)), False),
+            ('room calendar feed',
+             lambda: room_feed(db.session.get(RoomsList, 3), some_day, some_day + timedelta(days=60)), False),
+        ]
+
+        with app.test_request_context():
+            login_user(db.session.get(Users, 2))
+            for name, fn, ordered in checks:
+                statements = [s for s in capture(fn)
+                              if any(t in s[0] for t in WATCHED_TABLES) and s[0].lstrip().upper().startswith('SELECT')]
+                bad = []
+                for sql, params in statements:
+                    problems, plan = plan_problems(sql, params, ordered)
+                    if problems:
+                        bad.append((sql, plan, problems))
+
+                if bad:
+                    failures += 1
+                    print(f"FAIL  {name}")
+                    for sql, plan, problems in bad:
+                        print("      " + " ".join(sql.split())[:200])
+                        for line in plan:
+                            print(f"        {line}")
+                else:
+                    print(f"ok    {name} ({len(statements)} queries)")
+
+    print()
+    if failures:
+        print(f"{failures} check(s) fell back to a table scan or a sort.")
+        sys.exit(1)
+    print("All hot paths use their indexes.")
+
+
+if __name__ == '__main__':
+    main()
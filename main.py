@@ -1,6 +1,10 @@
 from Website import create_app
 
-app = create_app()
+# First run (and after adding models): create the tables with
+#   flask --app main init-db
+
+# START_JOBS: the background jobs (message classifier, forecasts, archiver)
+app = create_app({'START_JOBS': True})
 
 if __name__ == '__main__':
     app.run(debug=True) 
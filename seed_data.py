@@ -0,0 +1,222 @@
+"""
+SEED DATA GENERATOR: Fills a database with realistic fake portal data.
+
+Used by benchmark.py, and handy on its own for trying the app with a big
+database. Everything comes from a fixed random seed, so two runs with the
+same sizes give the same data.
+
+    python seed_data.py sqlite:///instance/big.db                # full size
+    python seed_data.py sqlite:///instance/small.db --scale 0.01
+
+Full size is 2k rooms, 20k timetable entries (materialized over four
+semesters), 1M bookings and 100k contact messages. Bookings never overlap
+each other and timetable entries never overlap inside a room, so the data
+also loads into PostgreSQL with the overlap constraint in place.
+"""
+import argparse
+import random
+import time as _time
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import insert, text
+from werkzeug.security import generate_password_hash
+
+FULL_SIZES = {
+    'rooms': 2000,
+    'schedules': 20000,
+    'bookings': 1000000,
+    'messages': 100000,
+    'users': 5000,
+}
+
+PASSWORD = 'password1'  # every generated user can log in with this
+FIRST_DAY = date(2024, 9, 1)
+LAST_DAY = date(2026, 6, 30)
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+OPENING_HOURS = range(8, 22)   # bookings start on the hour, 8:00 .. 21:00
+CLASS_BLOCKS = range(8, 20, 2)  # two-hour classes, 8-10 .. 18-20
+CHUNK = 50000
+
+SEMESTERS = [
+    ('Fall 2024', date(2024, 9, 2), date(2024, 12, 20)),
+    ('Spring 2025', date(2025, 1, 13), date(2025, 5, 9)),
+    ('Fall 2025', date(2025, 9, 1), date(2025, 12, 31)),
+    ('Spring 2026', date(2026, 1, 12), date(2026, 5, 8)),
+]
+HOLIDAYS = [
+    (date(2024, 11, 28), 'Thanksgiving'),
+    (date(2025, 3, 17), 'Spring break'),
+    (date(2025, 11, 27), 'Thanksgiving'),
+    (date(2026, 3, 16), 'Spring break'),
+]
+
+MESSAGE_TEMPLATES = [
+    "The projector in {room} is broken",
+    "AC is not working in {room}, it's way too hot",
+    "Wifi keeps disconnecting in {room}",
+    "Exposed wires next to the socket in {room}",
+    "How do I book {room} after 6 PM?",
+    "My booking for {room} is still pending",
+    "Great rooms, thanks for the new system!",
+    "The chairs in {room} are damaged",
+]
+
+
+def scaled_sizes(scale=1.0, **overrides):
+    sizes = {name: max(1, int(count * scale)) for name, count in FULL_SIZES.items()}
+    sizes.update({name: count for name, count in overrides.items() if count is not None})
+    return sizes
+
+
+def _chunks(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= CHUNK:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(db, model, rows):
+    count = 0
+    for batch in _chunks(rows):
+        db.session.execute(insert(model), batch)
+        count += len(batch)
+    db.session.commit()
+    return count
+
+
+def generate(db, sizes, seed=42, verbose=True):
+    """
+    Inserts the fake data into an empty database (inside an app context).
+    Returns the sizes actually written.
+    """
+    from Website.models import Users, RoomsList, SemesterSchedule, BookingsNew, Messages
+
+    rng = random.Random(seed)
+    started = _time.perf_counter()
+
+    def log(msg):
+        if verbose:
+            print(f"  [{_time.perf_counter() - started:6.1f}s] {msg}")
+
+    # --- users (user 1 is the admin, then faculty, then students) ---
+    password = generate_password_hash(PASSWORD, method='pbkdf2:sha256')
+    faculty_count = max(1, sizes['users'] // 10)
+    _insert(db, Users, ({
+        'email': f'user{i}@uni.edu',
+        'first_name': f'User {i}',
+        'password': password,
+        'role': 'admin' if i == 1 else ('faculty' if i <= faculty_count else 'student')
+    } for i in range(1, sizes['users'] + 1)))
+    log(f"{sizes['users']} users")
+
+    # --- rooms ---
+    _insert(db, RoomsList, ({
+        'name': f'Room {i}',
+        'capacity': rng.choice([10, 20, 30, 40, 60, 80, 120]),
+        'is_active': rng.random() > 0.02,
+        'amenities': rng.choice(['projector, wifi', 'whiteboard', 'smart board, wifi', 'lab PCs, projector']),
+        'location': f'Block {chr(65 + i % 8)}'
+    } for i in range(1, sizes['rooms'] + 1)))
+    log(f"{sizes['rooms']} rooms")
+
+    # --- timetable: distinct (room, weekday, block) so classes never overlap in a room ---
+    class_space = sizes['rooms'] * len(WEEKDAYS) * len(CLASS_BLOCKS)
+    picks = rng.sample(range(class_space), min(sizes['schedules'], class_space))
+
+    def schedules():
+        for n in picks:
+            room, rest = divmod(n, len(WEEKDAYS) * len(CLASS_BLOCKS))
+            day, block = divmod(rest, len(CLASS_BLOCKS))
+            hour = CLASS_BLOCKS[block]
+            yield {
+                'room_id': room + 1, 'day_of_week': WEEKDAYS[day],
+                'start_time': time(hour), 'end_time': time(hour + 2),
+                'course_name': f'CS{100 + n % 400}'
+            }
+    _insert(db, SemesterSchedule, schedules())
+    log(f"{len(picks)} timetable entries")
+
+    # --- bookings: distinct (room, day, hour) one-hour slots, so no two overlap ---
+    days = (LAST_DAY - FIRST_DAY).days + 1
+    slot_space = sizes['rooms'] * days * len(OPENING_HOURS)
+    slots = rng.sample(range(slot_space), min(sizes['bookings'], slot_space))
+
+    def bookings():
+        for n in slots:
+            room, rest = divmod(n, days * len(OPENING_HOURS))
+            day, hour_index = divmod(rest, len(OPENING_HOURS))
+            hour = OPENING_HOURS[hour_index]
+            booking_date = FIRST_DAY + timedelta(days=day)
+            evening = hour >= 18
+            status = rng.choices(['Confirmed', 'Pending', 'Rejected'], weights=[80, 5, 15])[0]
+            if evening and status == 'Confirmed' and rng.random() < 0.5:
+                status = 'Pending'
+            yield {
+                'user_id': rng.randint(1, sizes['users']),
+                'room_id': room + 1,
+                'booking_date': booking_date,
+                'start_time': time(hour),
+                'end_time': time(hour + 1),
+                'status': status,
+                'reason': 'Evening study group' if evening else None,
+                'created_at': datetime.combine(booking_date - timedelta(days=rng.randint(1, 30)), time(12))
+            }
+    _insert(db, BookingsNew, bookings())
+    log(f"{len(slots)} bookings")
+
+    # --- contact messages, oldest first, mostly already seen ---
+    span_minutes = days * 24 * 60
+    _insert(db, Messages, ({
+        'name': f'User {rng.randint(2, sizes["users"])}',
+        'email': 'student@uni.edu',
+        'content': rng.choice(MESSAGE_TEMPLATES).format(room=f'Room {rng.randint(1, sizes["rooms"])}'),
+        'timestamp': datetime.combine(FIRST_DAY, time(0)) + timedelta(minutes=i * span_minutes // sizes['messages']),
+        'seen': rng.random() < 0.9
+    } for i in range(sizes['messages'])))
+    log(f"{sizes['messages']} messages")
+
+    # --- semesters covering the booking history, a few holidays, then the class calendar ---
+    from Website import analytics, forecasting, semesters
+    from Website.models import Semester, Holiday
+    # init-db already created the default Fall 2025 semester - keep it, add the rest
+    existing = {name for (name,) in db.session.query(Semester.name)}
+    _insert(db, Semester, ({'name': name, 'start_date': start, 'end_date': end}
+                           for name, start, end in SEMESTERS if name not in existing))
+    _insert(db, Holiday, ({'holiday_date': day, 'name': name} for day, name in HOLIDAYS))
+    log(f"{semesters.materialize()} class meetings materialized")
+
+    # Derived tables the app normally keeps up to date as it goes
+    analytics.rebuild_rollup()
+    forecasting.train_models()
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+    log("rollup rebuilt, forecasts trained")
+
+    return {**sizes, 'schedules': len(picks), 'bookings': len(slots)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('database_url', help="e.g. sqlite:///instance/big.db (must be empty)")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiply every full size by this")
+    for name in FULL_SIZES:
+        parser.add_argument(f'--{name}', type=int, help=f"number of {name} (overrides --scale)")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from Website import create_app, create_database, db
+    app = create_app({'SQLALCHEMY_DATABASE_URI': args.database_url, 'TESTING': True})
+    create_database(app)
+    sizes = scaled_sizes(args.scale, **{name: getattr(args, name) for name in FULL_SIZES})
+    with app.app_context():
+        print(f"Seeding {args.database_url}: {sizes}")
+        generate(db, sizes, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()